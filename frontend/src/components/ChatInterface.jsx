@@ -32,6 +32,7 @@ export default function Home() {
   const inputRef = useRef(null);
   const mediaRecorderRef = useRef(null);
   const audioChunksRef = useRef([]);
+  const sessionIdRef = useRef(crypto.randomUUID());
 
   useEffect(() => {
     let interval;
@@ -147,10 +148,12 @@ export default function Home() {
           "Content-Type": "application/json",
         },
         body: JSON.stringify({
-          "query": text
+          "query": text,
+          "session_id": sessionIdRef.current
         }),
       });
 
+      const requestKey = response.headers.get("X-Request-Key");
       const data = await response.json();
       const parsedData = JSON.parse(data);
       const aiMessage = { role: "ai", content: parsedData.Message };
@@ -164,6 +167,8 @@ export default function Home() {
         body: JSON.stringify(
           { command: parsedData.Routing.Action,
             details: parsedData.Routing.Details, 
+            query: text,
+            request_key: requestKey,
           }
 
         ),
@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from api import metrics
+from api.config import settings
+
+# Blocking SDK calls run here instead of on the event loop
+_executor = ThreadPoolExecutor(max_workers=settings.BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+# asyncio semaphores belong to one event loop, so each loop gets its own set
+_semaphores = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_in_flight = {}
+
+
+def backend_limits():
+    """Return the maximum number of concurrent calls allowed per backend."""
+    return {
+        "embedding": settings.EMBEDDING_CONCURRENCY,
+        "pinecone": settings.PINECONE_CONCURRENCY,
+        "files": settings.FILES_CONCURRENCY,
+        "subprocess": settings.SUBPROCESS_CONCURRENCY,
+    }
+
+
+def _semaphore(backend):
+    loop = asyncio.get_running_loop()
+    with _lock:
+        semaphores = _semaphores.setdefault(loop, {})
+        if backend not in semaphores:
+            semaphores[backend] = asyncio.Semaphore(backend_limits()[backend])
+        return semaphores[backend]
+
+
+@asynccontextmanager
+async def limit(backend):
+    """Hold one of ``backend``'s concurrency slots, recording wait and call time."""
+    start = time.perf_counter()
+    async with _semaphore(backend):
+        metrics.observe(f"{backend}.queue_wait", time.perf_counter() - start)
+        _in_flight[backend] = _in_flight.get(backend, 0) + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _in_flight[backend] -= 1
+            metrics.observe(f"{backend}.call", time.perf_counter() - start)
+
+
+async def run_blocking(backend, fn, *args, **kwargs):
+    """Run a blocking call on the shared executor within ``backend``'s concurrency limit."""
+    async with limit(backend):
+        loop = asyncio.get_running_loop()
+        # Carry context variables such as the LLM deadline over to the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+def stats():
+    """Return the concurrency limit and calls in flight for each backend."""
+    return {backend: {"limit": value, "in_flight": _in_flight.get(backend, 0)} for backend, value in backend_limits().items()}
+
+
+metrics.register("async_io", stats)
@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from api import metrics
+
+# Seconds a cache read or write waits for another process holding the SQLite file
+DB_TIMEOUT = 5.0
+
+
+def normalize_text(text):
+    """Lowercase, collapse whitespace and strip surrounding punctuation so equivalent phrasings share a key."""
+    text = re.sub(r"\s+", " ", (text or "").lower()).strip()
+    return text.strip(" .,!?;:'\"")
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a TTL, optional SQLite persistence and hit/miss counters.
+
+    Values are kept as-is in memory and encoded with ``dumps`` on disk (JSON by default),
+    so callers should not mutate what ``get`` returns.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=None, path=None, dumps=json.dumps, loads=json.loads):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path, timeout=DB_TIMEOUT, check_same_thread=False)
+            # Cache files can be shared with other processes; WAL lets readers run alongside a writer
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+            self.conn.commit()
+
+        metrics.register(f"cache.{name}", self.stats)
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key``, or ``default`` on a miss or expired entry."""
+        now = time.time()
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and (item[0] is None or item[0] > now):
+                self.data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.data.pop(key, None)
+
+            if self.conn is not None:
+                try:
+                    row = self.conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"Error reading cache {self.name}: {e}")
+                    row = None
+                if row and (row[1] is None or row[1] > now):
+                    value = self.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``, evicting the least recently used entry when full."""
+        expires = time.time() + self.ttl if self.ttl else None
+        with self.lock:
+            self._remember(key, value, expires)
+            if self.conn is not None:
+                # A failed write only costs the disk copy; the value stays cached in memory
+                try:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, self.dumps(value), expires)
+                    )
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    self.conn.rollback()
+                    metrics.incr(f"cache.{self.name}.write_errors")
+                    print(f"Error writing cache {self.name}: {e}")
+
+    def items(self):
+        """Return every unexpired (key, value) pair, read from disk when the cache is persisted."""
+        now = time.time()
+        with self.lock:
+            if self.conn is None:
+                return [(key, value) for key, (expires, value) in self.data.items() if expires is None or expires > now]
+            try:
+                rows = self.conn.execute("SELECT key, value, expires FROM entries").fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading cache {self.name}: {e}")
+                return []
+        return [(key, self.loads(value)) for key, value, expires in rows if expires is None or expires > now]
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when ``key`` is None."""
+        with self.lock:
+            if key is None:
+                self.data.clear()
+            else:
+                self.data.pop(key, None)
+            if self.conn is not None:
+                if key is None:
+                    self.conn.execute("DELETE FROM entries")
+                else:
+                    self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the in-memory size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.data),
+        }
+
+    def _remember(self, key, value, expires):
+        self.data[key] = (expires, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
@@ -0,0 +1,136 @@
+import ast
+import hashlib
+import os
+import re
+import threading
+import time
+
+from api import metrics
+from api.cache import LRUCache, normalize_text
+from api.config import settings
+from api.semantic_cache import SemanticCache
+
+FENCE_PATTERN = re.compile(r"^```[\w+-]*\s*\n?|\n?```\s*$")
+
+
+def clean_code(text):
+    """Strip surrounding markdown code fences and whitespace from generated code."""
+    return FENCE_PATTERN.sub("", (text or "").strip()).strip()
+
+
+def check_syntax(code):
+    """Return (ok, error) for whether ``code`` parses as Python."""
+    try:
+        ast.parse(code)
+        return True, None
+    except SyntaxError as e:
+        return False, f"{e.msg} (line {e.lineno})"
+
+
+def code_key(prompt, model):
+    """Cache key of a code generation request: a hash of the model and the normalized prompt."""
+    return hashlib.sha256(f"{model}\0{normalize_text(prompt)}".encode("utf-8")).hexdigest()
+
+
+class CodeCache:
+    """Generated code keyed by normalized prompt and model, with its syntax check and last successful run.
+
+    Only code that parses is served back. With ``semantic`` on, a prompt without an exact
+    entry may reuse the code of a close paraphrase, but only code that has run successfully.
+    The prompt embedding is kept in the entry, so the semantic tier is restored from disk.
+    """
+
+    def __init__(self, maxsize=256, ttl=None, path=None, semantic=False, threshold=0.92):
+        self.entries = LRUCache("generated_code", maxsize=maxsize, ttl=ttl, path=path)
+        self.semantic = SemanticCache("generated_code_semantic", threshold=threshold, ttl=ttl, maxsize=maxsize) if semantic else None
+        self.semantic_loaded = False
+        self.lock = threading.Lock()
+
+    def get(self, prompt, model):
+        """Return the cached entry for a prompt, or None."""
+        entry = self.entries.get(code_key(prompt, model))
+        if entry is None and self.semantic is not None:
+            self.load_semantic()
+            key = self.semantic.lookup(self._embed(prompt))
+            entry = self.entries.get(key) if key else None
+            # A paraphrase only reuses code that has run successfully
+            if entry is not None and entry["model"] == model and entry.get("last_success"):
+                metrics.incr("code_cache.semantic_hits")
+            else:
+                entry = None
+        if entry is None or not entry["syntax_ok"]:
+            return None
+        return entry
+
+    def put(self, prompt, model, text):
+        """Clean, syntax-check and store generated code, returning the new entry."""
+        code = clean_code(text)
+        ok, error = check_syntax(code)
+        if not ok:
+            metrics.incr("code_cache.syntax_errors")
+        entry = {
+            "prompt": prompt,
+            "model": model,
+            "code": code,
+            "syntax_ok": ok,
+            "syntax_error": error,
+            "created": time.time(),
+            "last_success": None,
+        }
+        self.entries.set(code_key(prompt, model), entry)
+        return entry
+
+    def mark_success(self, prompt, model):
+        """Record that the cached code for a prompt ran successfully."""
+        key = code_key(prompt, model)
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        now = time.time()
+        if self.semantic is None:
+            self.entries.set(key, dict(entry, last_success=now))
+            return
+        self.load_semantic()
+        vector = entry.get("vector") or self._embed(prompt)
+        self.entries.set(key, dict(entry, last_success=now, vector=vector))
+        if not (entry.get("last_success") and entry.get("vector")):
+            self.semantic.store(prompt, vector, key, created=now)
+
+    def invalidate(self, prompt=None, model=None):
+        """Drop the entry for one prompt and model, or everything when no prompt is given."""
+        if prompt is None:
+            self.entries.invalidate()
+            if self.semantic is not None:
+                self.semantic.invalidate()
+        else:
+            key = code_key(prompt, model)
+            self.entries.invalidate(key)
+            # Code generated again for this prompt has not run yet, so paraphrases must not reach it
+            if self.semantic is not None:
+                self.semantic.discard(key)
+
+    def load_semantic(self):
+        """Fill the semantic tier from the persisted entries that have run successfully, once."""
+        if self.semantic is None:
+            return
+        with self.lock:
+            if self.semantic_loaded:
+                return
+            self.semantic_loaded = True
+            for key, entry in self.entries.items():
+                if entry.get("syntax_ok") and entry.get("last_success") and entry.get("vector"):
+                    self.semantic.store(entry["prompt"], entry["vector"], key, created=entry["last_success"])
+
+    def _embed(self, prompt):
+        # Imported here so scripts using only exact lookups do not connect to the vector store
+        from api.utils import gemini_embed_text
+        return gemini_embed_text(prompt)
+
+
+code_cache = CodeCache(
+    maxsize=settings.CODE_CACHE_SIZE,
+    ttl=settings.CODE_CACHE_TTL,
+    path=os.path.join(settings.CACHE_DIR, "code-cache.sqlite"),
+    semantic=settings.CODE_CACHE_SEMANTIC,
+    threshold=settings.CODE_CACHE_SEMANTIC_THRESHOLD,
+)
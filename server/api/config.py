@@ -1,16 +1,113 @@
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
 load_dotenv()
 
 class Settings(BaseSettings):
-    GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY")
-    PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY")
+    # Optional so the server starts without them; the Gemini and Pinecone clients
+    # raise a clear error on first use instead
+    GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
+    PINECONE_API_KEY: Optional[str] = os.getenv("PINECONE_API_KEY")
     PINECONE_INDEX_NAME: str = "isef-project"
     PINECONE_NAMESPACE: str = "task-commands"
+
+    # Retrieval backend: "pinecone", or "local" for the in-process copy of PINECONE_NAMESPACE
+    VECTOR_STORE: str = "pinecone"
+    HNSW_THRESHOLD: int = 50_000
+    HNSW_EF: int = 64
     
     # CORS Configuration
     ALLOWED_ORIGINS: list = ["*"]
 
+    # Local caches and indexes
+    CACHE_DIR: str = os.getenv("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "side-project"))
+    FILE_INDEX_REFRESH_SECONDS: float = 30.0
+    CRAWLER_WORKERS: int = 8
+    CONTENT_INDEX_ENABLED: bool = False
+    CONTENT_INDEX_WORKERS: int = 2
+    CONTENT_INDEX_MAX_CHARS: int = 1_000_000
+    HASH_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    QUERY_CACHE_SIZE: int = 512
+    QUERY_CACHE_TTL: float = 24 * 60 * 60
+    QUERY_CACHE_PERSIST: bool = True
+    EMBEDDING_CACHE_SIZE: int = 4096
+
+    # Semantic cache of commands chosen by /execute/; a hit needs this cosine similarity
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_TTL: float = 60 * 60
+    SEMANTIC_CACHE_SIZE: int = 1024
+
+    # LLM gateway: per-call timeout and the deadline of interactive requests in seconds, retries of 429/5xx
+    # with jittered backoff, and concurrent calls per model (LLM_MODEL_CONCURRENCY overrides by name)
+    LLM_TIMEOUT: float = 60.0
+    REQUEST_DEADLINE: float = 120.0
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8.0
+    LLM_CONCURRENCY: int = 8
+    LLM_MODEL_CONCURRENCY: dict = {}
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_SINGLEFLIGHT: bool = True
+    # Per-model request and token budgets per minute (0 for unlimited); LLM_MODEL_RATE_LIMITS
+    # maps a model name to {"rpm": ..., "tpm": ...}. Calls whose queue time would pass their
+    # deadline fail at once when LLM_RATE_FAIL_FAST is set.
+    LLM_RPM: int = 1000
+    LLM_TPM: int = 1_000_000
+    LLM_MODEL_RATE_LIMITS: dict = {}
+    LLM_RATE_FAIL_FAST: bool = True
+
+    # Concurrency limits for blocking backends called from async handlers
+    BLOCKING_IO_WORKERS: int = 32
+    EMBEDDING_CONCURRENCY: int = 8
+    PINECONE_CONCURRENCY: int = 16
+    FILES_CONCURRENCY: int = 4
+    SUBPROCESS_CONCURRENCY: int = 2
+
+    # Router chat sessions; the window counts exchanges, older ones are summarized
+    SESSION_HISTORY_WINDOW: int = 10
+    SESSION_SUMMARY_MAX_CHARS: int = 2000
+    SESSION_IDLE_SECONDS: float = 30 * 60
+    SESSION_MAX_SESSIONS: int = 1000
+    SESSION_MAX_CHARS: int = 5_000_000
+
+    # Local intent classification before the router LLM; a centroid match must reach
+    # INTENT_MIN_SCORE and beat the runner-up by INTENT_MIN_MARGIN. A sample of fast-path
+    # answers is also sent to the LLM to measure disagreement.
+    INTENT_FAST_PATH: bool = True
+    INTENT_MIN_SCORE: float = 0.75
+    INTENT_MIN_MARGIN: float = 0.05
+    INTENT_AUDIT_RATE: float = 0.05
+
+    # Generated code, keyed by normalized prompt and model; semantic lookup reuses
+    # working code for close paraphrases
+    CODE_CACHE_SIZE: int = 256
+    CODE_CACHE_TTL: float = 7 * 24 * 60 * 60
+    CODE_CACHE_SEMANTIC: bool = False
+    CODE_CACHE_SEMANTIC_THRESHOLD: float = 0.92
+
+    # Retrieved examples joined into the /execute/ prompt
+    CONTEXT_TOKEN_BUDGET: int = 2000
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8
+    CONTEXT_CACHE_SIZE: int = 256
+
+    # Retrieval started by /router/ before the route is known, reused by /execute/
+    SPECULATIVE_RETRIEVAL: bool = True
+    SPECULATION_TTL: float = 30.0
+
+    # Startup: backend clients are created on first use; with WARM_UP they are also
+    # created in the background as the server starts, so the first requests do not wait
+    WARM_UP: bool = False
+
+    # Bulk ingestion
+    EMBED_BATCH_SIZE: int = 100
+    UPSERT_CHUNK_SIZE: int = 100
+    INGEST_PARALLELISM: int = 4
+
+    # Download server; extra roots map a URL name to a directory, and the bandwidth
+    # limit is bytes per second per connection (0 for unlimited)
+    FILE_SERVER_ROOTS: dict = {}
+    FILE_SERVER_RATE_LIMIT: int = 0
+
 settings = Settings()
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from xml.etree import ElementTree
+
+from api.config import settings
+from api.crawler import crawl
+
+# PDF extraction is optional; without pypdf, PDFs are simply left out of the content index
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime_ns INTEGER, size INTEGER);
+CREATE VIRTUAL TABLE IF NOT EXISTS content USING fts5(path UNINDEXED, body, tokenize = 'unicode61');
+"""
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+CONTENT_EXTENSIONS = {".txt", ".md", ".docx", ".pdf"}
+
+
+def _read_text(path):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read(settings.CONTENT_INDEX_MAX_CHARS)
+
+
+def _read_docx(path):
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(f"{WORD_NAMESPACE}p"):
+        paragraphs.append("".join(node.text or "" for node in paragraph.iter(f"{WORD_NAMESPACE}t")))
+    return "\n".join(paragraphs)[:settings.CONTENT_INDEX_MAX_CHARS]
+
+
+def _read_pdf(path):
+    if PdfReader is None:
+        return None
+    text = []
+    length = 0
+    for page in PdfReader(path).pages:
+        page_text = page.extract_text() or ""
+        text.append(page_text)
+        length += len(page_text)
+        if length >= settings.CONTENT_INDEX_MAX_CHARS:
+            break
+    return "\n".join(text)[:settings.CONTENT_INDEX_MAX_CHARS]
+
+
+EXTRACTORS = {".txt": _read_text, ".md": _read_text, ".docx": _read_docx, ".pdf": _read_pdf}
+
+
+def extract_text(path):
+    """Extract the plain text of a supported document, or None if it cannot be read."""
+    extractor = EXTRACTORS.get(os.path.splitext(path)[1].lower())
+    if extractor is None:
+        return None
+    try:
+        return extractor(path)
+    except Exception as e:
+        print(f"Error extracting text from {path}: {e}")
+        return None
+
+
+def _is_document(entry):
+    return os.path.splitext(entry.name)[1].lower() in CONTENT_EXTENSIONS
+
+
+def fts_query(query):
+    """Quote every token of a free-text query so FTS5 syntax characters cannot break it."""
+    tokens = re.findall(r"\w+", query.lower())
+    return " ".join(f'"{token}"' for token in tokens)
+
+
+class ContentIndex:
+    """SQLite FTS5 index of the text inside one root's documents, updated from file mtimes."""
+
+    def __init__(self, root, index_dir=None):
+        self.root = os.path.abspath(root)
+        index_dir = index_dir or os.path.join(settings.CACHE_DIR, "content-index")
+        os.makedirs(index_dir, exist_ok=True)
+        digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+        self.db_path = os.path.join(index_dir, f"{digest}.sqlite")
+        self.lock = threading.Lock()
+        self.update_future = None
+        self.last_update = 0.0
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def schedule_update(self, force=False):
+        """Queue an incremental update on the background pool unless one is pending or ran recently."""
+        with self.lock:
+            if self.update_future and not self.update_future.done():
+                return
+            if not force and time.time() - self.last_update < settings.FILE_INDEX_REFRESH_SECONDS:
+                return
+            self.update_future = _update_pool.submit(self.update)
+
+    def update(self):
+        """Re-extract documents whose mtime or size changed and drop the ones that disappeared."""
+        start = time.time()
+        with self.lock:
+            rows = self.conn.execute("SELECT path, mtime_ns, size FROM docs")
+            known = {path: (mtime_ns, size) for path, mtime_ns, size in rows}
+
+        seen = set()
+        changed = []
+        for entry in crawl(self.root, match=_is_document):
+            seen.add(entry.path)
+            if known.get(entry.path) != (entry.mtime_ns, entry.size):
+                changed.append(entry)
+
+        futures = {_extract_pool.submit(extract_text, entry.path): entry for entry in changed}
+        for future in as_completed(futures):
+            entry = futures[future]
+            self._store(entry, future.result())
+
+        with self.lock:
+            for path in set(known) - seen:
+                self._delete(path)
+            self.conn.commit()
+            self.last_update = time.time()
+        print(f"Content index for {self.root}: {len(changed)} updated in {time.time() - start:.2f}s")
+
+    def search(self, query, directory=None, max_results=5):
+        """Return the best matching documents with a highlighted snippet, best first."""
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT path, snippet(content, 1, '[', ']', '...', 12), bm25(content) AS rank "
+            "FROM content WHERE content MATCH ?"
+        )
+        params = [match]
+        if directory and os.path.abspath(directory) != self.root:
+            sql += " AND path LIKE ? ESCAPE '\\'"
+            prefix = os.path.abspath(directory).rstrip(os.sep) + os.sep
+            params.append(prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(max_results)
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{"path": path, "snippet": snippet, "score": -rank} for path, snippet, rank in rows]
+
+    def _store(self, entry, text):
+        """Replace the indexed text of one document."""
+        with self.lock:
+            self._delete(entry.path)
+            # Record unreadable files too, so they are not retried until they change
+            cursor = self.conn.execute(
+                "INSERT INTO docs (path, mtime_ns, size) VALUES (?, ?, ?)", (entry.path, entry.mtime_ns, entry.size)
+            )
+            if text:
+                self.conn.execute(
+                    "INSERT INTO content (rowid, path, body) VALUES (?, ?, ?)", (cursor.lastrowid, entry.path, text)
+                )
+            self.conn.commit()
+
+    def _delete(self, path):
+        """Remove one document by the rowid it shares with its FTS row."""
+        row = self.conn.execute("SELECT id FROM docs WHERE path = ?", (path,)).fetchone()
+        if row:
+            self.conn.execute("DELETE FROM content WHERE rowid = ?", (row[0],))
+            self.conn.execute("DELETE FROM docs WHERE id = ?", (row[0],))
+
+
+# Orchestration and extraction run on separate pools so an update never waits on its own worker
+_update_pool = ThreadPoolExecutor(max_workers=1)
+_extract_pool = ThreadPoolExecutor(max_workers=settings.CONTENT_INDEX_WORKERS)
+
+_indexes = {}
+_registry_lock = threading.Lock()
+
+
+def get_content_index(directory):
+    """Return the content index whose root covers ``directory``, creating one rooted there if none does."""
+    directory = os.path.abspath(directory)
+    with _registry_lock:
+        for root, index in _indexes.items():
+            if directory == root or directory.startswith(root.rstrip(os.sep) + os.sep):
+                return index
+        index = ContentIndex(directory)
+        _indexes[directory] = index
+        return index
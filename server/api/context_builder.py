@@ -0,0 +1,67 @@
+import hashlib
+import re
+
+from api import metrics
+from api.cache import LRUCache, normalize_text
+from api.config import settings
+
+SEPARATOR = "\n\n-------\n\n"
+
+# Assembled context per match set; cleared when the command corpus changes
+context_cache = LRUCache("context", maxsize=settings.CONTEXT_CACHE_SIZE)
+
+
+def estimate_tokens(text):
+    """Approximate the token count of a text at four characters per token."""
+    return (len(text) + 3) // 4
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", normalize_text(text))
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _similarity(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def build_context(matches, token_budget=None):
+    """Join the ``example`` text of vector matches, best first, without near-duplicates and within a token budget."""
+    token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    match_set = "|".join(f"{match.get('id')}:{match.get('score', 0.0):.4f}" for match in matches)
+    key = hashlib.sha256(f"{token_budget}|{match_set}".encode("utf-8")).hexdigest()
+    context = context_cache.get(key)
+    if context is not None:
+        return context
+
+    examples = []
+    seen = []
+    used = 0
+    for match in sorted(matches, key=lambda match: match.get("score", 0.0), reverse=True):
+        example = (match.get("metadata") or {}).get("example")
+        if not example:
+            continue
+        shingles = _shingles(example)
+        if any(_similarity(shingles, other) >= settings.CONTEXT_DEDUP_THRESHOLD for other in seen):
+            metrics.incr("context.duplicates_dropped")
+            continue
+        tokens = estimate_tokens(example + SEPARATOR)
+        if used + tokens > token_budget:
+            if examples:
+                # A shorter, lower-scored example may still fit
+                metrics.incr("context.examples_trimmed")
+                continue
+            # Always keep the best example, cut down to the budget
+            example = example[:token_budget * 4]
+            tokens = token_budget
+            metrics.incr("context.examples_truncated")
+        examples.append(example)
+        seen.append(shingles)
+        used += tokens
+
+    context = SEPARATOR.join(examples)
+    metrics.record("context.tokens", estimate_tokens(context))
+    context_cache.set(key, context)
+    return context
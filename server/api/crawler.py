@@ -0,0 +1,70 @@
+import fnmatch
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from api.config import settings
+
+FileEntry = namedtuple("FileEntry", ["path", "name", "size", "mtime_ns", "inode"])
+
+
+def _is_excluded(entry, root, exclude):
+    """Check an entry's name and root-relative path against the exclude globs."""
+    if not exclude:
+        return False
+    rel_path = os.path.relpath(entry.path, root)
+    return any(fnmatch.fnmatch(entry.name, pattern) or fnmatch.fnmatch(rel_path, pattern) for pattern in exclude)
+
+
+def _scan_dir(path, root, exclude, include_hidden):
+    """List one directory, returning its files as FileEntry tuples and its subdirectory paths."""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return files, subdirs
+
+    for entry in entries:
+        if not include_hidden and entry.name.startswith("."):
+            continue
+        if _is_excluded(entry, root, exclude):
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file():
+                # DirEntry caches the stat result, so this costs no extra syscall on most platforms
+                st = entry.stat()
+                files.append(FileEntry(entry.path, entry.name, st.st_size, st.st_mtime_ns, st.st_ino))
+        except OSError:
+            continue
+    return files, subdirs
+
+
+def crawl(root, match=None, max_depth=None, exclude=(), include_hidden=True, workers=None):
+    """Walk ``root`` with a bounded thread pool and yield matching FileEntry tuples as they are found.
+
+    ``max_depth`` 0 only lists ``root`` itself. Closing the generator early cancels the
+    directories still queued, so callers can stop as soon as they have enough results.
+    """
+    root = os.path.abspath(root)
+    executor = ThreadPoolExecutor(max_workers=workers or settings.CRAWLER_WORKERS)
+    pending = {executor.submit(_scan_dir, root, root, exclude, include_hidden): 0}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                depth = pending.pop(future)
+                files, subdirs = future.result()
+                if max_depth is None or depth < max_depth:
+                    for subdir in subdirs:
+                        pending[executor.submit(_scan_dir, subdir, root, exclude, include_hidden)] = depth + 1
+                for entry in files:
+                    if match is None or match(entry):
+                        yield entry
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,245 @@
+import email.utils
+import mimetypes
+import os
+import re
+import shutil
+import time
+import zipfile
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from api.crawler import FileEntry
+from api.hash_cache import file_etag, hash_cache
+
+CHUNK_SIZE = 1024 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Prefix marking a named root in download URLs; the default root is served from "/"
+ROOT_PREFIX = "@"
+
+# "Download all" archives are served from this path, with one ``f`` query parameter per file
+ARCHIVE_PATH = "/_archive.zip"
+
+# Formats that are already compressed are stored as-is instead of being deflated again
+STORED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".aac", ".ogg", ".flac", ".m4a",
+    ".mp4", ".mkv", ".mov", ".avi", ".webm",
+    ".docx", ".xlsx", ".pptx", ".pdf",
+}
+
+
+def parse_range(header, size):
+    """Parse a single-range ``Range`` header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be sent and raises ValueError when the
+    range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Multi-range and unknown units are answered with the full file, as RFC 9110 allows
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class ChunkedWriter:
+    """Write-only file object that sends buffered data as HTTP/1.1 chunks, throttled to a rate limit."""
+
+    def __init__(self, wfile, rate_limit=0):
+        self.wfile = wfile
+        self.rate_limit = rate_limit
+        self.buffer = bytearray()
+        self.started = time.monotonic()
+        self.sent = 0
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.wfile.write(b"%x\r\n" % len(self.buffer) + bytes(self.buffer) + b"\r\n")
+        self.sent += len(self.buffer)
+        self.buffer.clear()
+        if self.rate_limit:
+            ahead = self.sent / self.rate_limit - (time.monotonic() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def close(self):
+        self.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class DownloadHandler(BaseHTTPRequestHandler):
+    """Serves files below the server directory with keep-alive, Range support and sendfile."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "SideProjectFileServer/1.0"
+
+    def do_GET(self):
+        if urlsplit(self.path).path == ARCHIVE_PATH:
+            self.send_archive()
+        else:
+            self.send_file(head=False)
+
+    def do_HEAD(self):
+        self.send_file(head=True)
+
+    def resolve_path(self, url_path=None):
+        """Map a URL path onto a file below one of the served roots, or None if it escapes them."""
+        if url_path is None:
+            url_path = urlsplit(self.path).path
+        parts = unquote(url_path).lstrip("/").split("/")
+        root = self.server.roots.get("")
+        if parts[0].startswith(ROOT_PREFIX) and parts[0][1:] in self.server.roots:
+            root = self.server.roots[parts.pop(0)[1:]]
+        if root is None:
+            return None
+        root = os.path.realpath(root)
+        path = os.path.realpath(os.path.join(root, *parts))
+        if path != root and not path.startswith(root.rstrip(os.sep) + os.sep):
+            return None
+        return path
+
+    def send_file(self, head):
+        """Send a whole file or the requested byte range of it."""
+        path = self.resolve_path()
+        if not path or not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+
+        with f:
+            st = os.fstat(f.fileno())
+            etag = file_etag(st.st_size, st.st_mtime_ns, st.st_ino)
+            # The served version is authoritative; links built from stale index data catch up from it
+            hash_cache.observe(FileEntry(path, os.path.basename(path), st.st_size, st.st_mtime_ns, st.st_ino))
+            if etag in self.headers.get("If-None-Match", ""):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            # A resumed download whose file changed since the first part gets the whole new file
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if if_range and if_range.startswith('"') and if_range != etag:
+                range_header = None
+            try:
+                byte_range = parse_range(range_header, st.st_size)
+            except ValueError:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{st.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+            else:
+                start, end = 0, st.st_size - 1
+                self.send_response(HTTPStatus.OK)
+
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True))
+            self.end_headers()
+
+            if not head:
+                self.copy_range(f, start, end - start + 1)
+
+    def send_archive(self):
+        """Stream a ZIP of the requested files, built on the fly in constant memory."""
+        requested = parse_qs(urlsplit(self.path).query).get("f", [])
+        files = []
+        for url_path in dict.fromkeys(requested):
+            path = self.resolve_path(url_path)
+            if path and os.path.isfile(path):
+                files.append((unquote(url_path).lstrip("/"), path))
+        if not files:
+            self.send_error(HTTPStatus.NOT_FOUND, "No files found")
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", 'attachment; filename="files.zip"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        # ZipFile writes data descriptors when the output is not seekable, so nothing is buffered whole
+        writer = ChunkedWriter(self.wfile, rate_limit=self.server.rate_limit)
+        with zipfile.ZipFile(writer, mode="w", allowZip64=True) as archive:
+            for arcname, path in files:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                try:
+                    with open(path, "rb") as src, archive.open(info, mode="w", force_zip64=True) as dest:
+                        shutil.copyfileobj(src, dest, CHUNK_SIZE)
+                except OSError as e:
+                    print(f"Error adding {path} to archive: {e}")
+        writer.close()
+
+    def copy_range(self, f, offset, count):
+        """Copy ``count`` bytes from ``offset`` to the socket, throttled to the server's rate limit."""
+        rate_limit = self.server.rate_limit
+        chunk_size = min(CHUNK_SIZE, rate_limit) if rate_limit else CHUNK_SIZE
+        self.wfile.flush()
+        started = time.monotonic()
+        sent = 0
+        while sent < count:
+            # socket.sendfile uses os.sendfile where available, so data never passes through Python
+            written = self.connection.sendfile(f, offset + sent, min(chunk_size, count - sent))
+            if not written:
+                # The file shrank underneath us; drop the connection rather than spin
+                self.close_connection = True
+                break
+            sent += written
+            if rate_limit:
+                ahead = sent / rate_limit - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+class DownloadServer(ThreadingHTTPServer):
+    """Thread-per-connection download server for a mapping of root names to directories."""
+
+    daemon_threads = True
+
+    def __init__(self, address, roots, rate_limit=0):
+        self.roots = roots
+        self.rate_limit = rate_limit
+        super().__init__(address, DownloadHandler)
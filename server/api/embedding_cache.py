@@ -0,0 +1,75 @@
+import hashlib
+import os
+import time
+from array import array
+
+from api import metrics
+from api.cache import LRUCache, normalize_text
+from api.config import settings
+
+
+def embedding_key(model, text):
+    """Content address of an embedding: a hash of the model and the normalized text."""
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(values):
+    """Encode a vector as float32 bytes for the SQLite tier."""
+    return array("f", values).tobytes()
+
+
+def unpack_vector(blob):
+    """Decode float32 bytes back into a list of floats."""
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+# Shared by the API, the desktop assistant and ingestion jobs through the same SQLite file
+embedding_cache = LRUCache(
+    "embeddings",
+    maxsize=settings.EMBEDDING_CACHE_SIZE,
+    path=os.path.join(settings.CACHE_DIR, "embeddings.sqlite"),
+    dumps=pack_vector,
+    loads=unpack_vector,
+)
+
+
+def cached_embedding(model, text, compute):
+    """Return the embedding of ``text``, calling ``compute(text)`` only on a cache miss.
+
+    ``compute`` may return None on failure, in which case nothing is cached.
+    """
+    start = time.perf_counter()
+    key = embedding_key(model, text)
+    vector = embedding_cache.get(key)
+    if vector is not None:
+        metrics.observe("embedding.cache_hit", time.perf_counter() - start)
+        return vector
+
+    vector = compute(text)
+    if vector is not None:
+        vector = list(vector)
+        embedding_cache.set(key, vector)
+    metrics.observe("embedding.cache_miss", time.perf_counter() - start)
+    return vector
+
+
+def cached_embeddings(model, texts, compute_batch):
+    """Batch form of ``cached_embedding``: only the misses are passed to ``compute_batch``.
+
+    ``compute_batch(texts)`` returns one vector (or None) per text, and the result keeps
+    the order of ``texts``.
+    """
+    keys = [embedding_key(model, text) for text in texts]
+    vectors = [embedding_cache.get(key) for key in keys]
+    misses = [i for i, vector in enumerate(vectors) if vector is None]
+    if misses:
+        start = time.perf_counter()
+        computed = compute_batch([texts[i] for i in misses])
+        for i, vector in zip(misses, computed):
+            if vector is not None:
+                vectors[i] = list(vector)
+                embedding_cache.set(keys[i], vectors[i])
+        metrics.observe("embedding.batch", time.perf_counter() - start)
+    return vectors
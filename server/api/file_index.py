@@ -0,0 +1,301 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from api.config import settings
+from api.crawler import FileEntry
+from api.file_search import SearchEngine
+from api.hash_cache import hash_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT,
+    name TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+"""
+
+
+def _prefix_bounds(path):
+    """Return the (low, high) key range covering every path below ``path``."""
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class FileIndex:
+    """Persistent filename index for one served root, kept current from directory mtimes."""
+
+    def __init__(self, root, index_dir=None, db_path=None):
+        self.root = os.path.abspath(root)
+        if db_path is None:
+            index_dir = index_dir or os.path.join(settings.CACHE_DIR, "file-index")
+            os.makedirs(index_dir, exist_ok=True)
+            digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+            db_path = os.path.join(index_dir, f"{digest}.sqlite")
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.last_refresh = 0.0
+        self.engine = None
+        self.build_thread = None
+        self.refresh_thread = None
+        self.conn = self._connect()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('root', ?)", (self.root,))
+        conn.commit()
+        return conn
+
+    def is_built(self):
+        """Check whether a full build of this root has completed."""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone()
+        return row is not None
+
+    def build(self):
+        """Index the whole root from scratch into a new database, then swap it in.
+
+        Searches keep using the current index while the new one is built; only the
+        swap at the end takes the lock.
+        """
+        with self.build_lock:
+            start = time.time()
+            staging_path = self.db_path + ".building"
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            staging = FileIndex(self.root, db_path=staging_path)
+            staging._scan([staging.root])
+            staging.conn.execute("INSERT OR REPLACE INTO meta VALUES ('built_at', ?)", (str(time.time()),))
+            staging.conn.commit()
+            staging._load_engine()
+            staging.conn.close()
+            with self.lock:
+                self.conn.close()
+                os.replace(staging_path, self.db_path)
+                self.conn = self._connect()
+                self.engine = staging.engine
+                self.last_refresh = time.time()
+            print(f"Indexed {self.root} in {time.time() - start:.2f}s")
+
+    def build_in_background(self):
+        """Start a full build on a daemon thread unless one is already running."""
+        with _registry_lock:
+            if self.build_thread and self.build_thread.is_alive():
+                return
+            self.build_thread = threading.Thread(target=self.build, daemon=True)
+            self.build_thread.start()
+
+    def refresh(self):
+        """Rescan only the directories whose mtime changed since they were indexed.
+
+        The stat sweep over every indexed directory runs without the lock, so searches
+        keep reading the current index; only the changed directories are rescanned under it.
+        """
+        with self.lock:
+            dirs = self.conn.execute("SELECT path, mtime_ns FROM dirs").fetchall()
+        changed = []
+        for path, mtime_ns in dirs:
+            try:
+                st = os.stat(path)
+            except OSError:
+                changed.append(path)
+                continue
+            if st.st_mtime_ns != mtime_ns:
+                changed.append(path)
+        with self.lock:
+            # _sync_dir forgets directories that have disappeared since the sweep
+            self._scan(changed, recursive=False)
+            self.conn.commit()
+            self.last_refresh = time.time()
+
+    def refresh_in_background(self):
+        """Start a refresh on a daemon thread unless one is already running."""
+        with _registry_lock:
+            if self.refresh_thread and self.refresh_thread.is_alive():
+                return
+            self.refresh_thread = threading.Thread(target=self.refresh, daemon=True)
+            self.refresh_thread.start()
+
+    def ensure_current(self):
+        """Build the index on first use and start a background refresh when it is older than the refresh interval."""
+        if not self.is_built():
+            self.build()
+        elif time.time() - self.last_refresh > settings.FILE_INDEX_REFRESH_SECONDS:
+            self.refresh_in_background()
+
+    def files(self, directory=None):
+        """Return every indexed file path, optionally limited to those below ``directory``."""
+        with self.lock:
+            if not directory or os.path.abspath(directory) == self.root:
+                rows = self.conn.execute("SELECT path FROM files").fetchall()
+            else:
+                low, high = _prefix_bounds(os.path.abspath(directory))
+                rows = self.conn.execute("SELECT path FROM files WHERE path >= ? AND path < ?", (low, high)).fetchall()
+        return [row[0] for row in rows]
+
+    def search(self, query, directory=None, max_results=5):
+        """Rank indexed files against ``query`` with the trigram engine."""
+        with self.lock:
+            if self.engine is None:
+                self._load_engine()
+            return self.engine.search(query, max_results=max_results, directory=directory)
+
+    def _load_engine(self):
+        """Populate the in-memory search engine from the persisted rows."""
+        self.engine = SearchEngine(self.root)
+        for row in self.conn.execute("SELECT path, name, size, mtime_ns, inode FROM files"):
+            self.engine.add(FileEntry(*row))
+
+    def lookup(self, paths):
+        """Return the indexed FileEntry of each given path that is in the index."""
+        entries = {}
+        with self.lock:
+            for path in paths:
+                row = self.conn.execute(
+                    "SELECT path, name, size, mtime_ns, inode FROM files WHERE path = ?", (path,)
+                ).fetchone()
+                if row:
+                    entries[path] = FileEntry(*row)
+        return entries
+
+    def apply_change(self, entry, current):
+        """Update the row of a file changed in place, or drop it when ``current`` is None.
+
+        Editing a file does not change its directory's mtime, so refresh() never sees it;
+        the hasher and the download server report such files, and later links use the new data.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime_ns, inode FROM files WHERE path = ?", (entry.path,)).fetchone()
+            if row is None or (current is not None and row == (current.size, current.mtime_ns, current.inode)):
+                return
+            if current is None:
+                self.conn.execute("DELETE FROM files WHERE path = ?", (entry.path,))
+            else:
+                self.conn.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ?, inode = ? WHERE path = ?",
+                    (current.size, current.mtime_ns, current.inode, current.path),
+                )
+            self.conn.commit()
+            if self.engine is not None:
+                if current is None:
+                    self.engine.remove(entry.path)
+                elif current.path in self.engine.ids:
+                    self.engine.add(current)
+
+    def stats(self):
+        """Return file and directory counts for this index."""
+        with self.lock:
+            files = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            dirs = self.conn.execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+        return {"root": self.root, "files": files, "directories": dirs, "index": self.db_path}
+
+    def _scan(self, directories, recursive=True):
+        """Sync the given directories, descending into every subdirectory not indexed yet."""
+        stack = list(directories)
+        while stack:
+            path = stack.pop()
+            new_dirs = self._sync_dir(path)
+            if recursive:
+                stack.extend(new_dirs)
+            else:
+                # New subdirectories have never been seen, so they have to be walked in full
+                self._scan(new_dirs)
+
+    def _sync_dir(self, path):
+        """Bring one directory's rows in line with the disk and return its unindexed subdirectories."""
+        try:
+            st = os.stat(path)
+            entries = list(os.scandir(path))
+        except OSError:
+            self._remove_dir(path)
+            return []
+
+        files = []
+        subdirs = set()
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.add(entry.path)
+                elif entry.is_file():
+                    est = entry.stat()
+                    files.append(FileEntry(entry.path, entry.name, est.st_size, est.st_mtime_ns, est.st_ino))
+            except OSError:
+                continue
+
+        known_files = {row[0] for row in self.conn.execute("SELECT path FROM files WHERE dir = ?", (path,))}
+        stale = known_files - {entry.path for entry in files}
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in stale])
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            [(e.path, path, e.name, e.size, e.mtime_ns, e.inode) for e in files],
+        )
+        if self.engine is not None:
+            for stale_path in stale:
+                self.engine.remove(stale_path)
+            # Re-adding known files refreshes the stat data carried through to download links
+            for entry in files:
+                self.engine.add(entry)
+
+        known_dirs = {row[0] for row in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,))}
+        for gone in known_dirs - subdirs:
+            self._remove_dir(gone)
+
+        parent = os.path.dirname(path) if path != self.root else None
+        self.conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (path, parent, st.st_mtime_ns))
+        return sorted(subdirs - known_dirs)
+
+    def _remove_dir(self, path):
+        """Forget a directory and everything indexed below it."""
+        low, high = _prefix_bounds(path)
+        if self.engine is not None:
+            query = "SELECT path FROM files WHERE dir = ? OR (path >= ? AND path < ?)"
+            for (file_path,) in self.conn.execute(query, (path, low, high)).fetchall():
+                self.engine.remove(file_path)
+        self.conn.execute("DELETE FROM files WHERE dir = ? OR (path >= ? AND path < ?)", (path, low, high))
+        self.conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+
+
+_indexes = {}
+_registry_lock = threading.Lock()
+
+
+def get_file_index(directory):
+    """Return the index whose root covers ``directory``, creating one rooted there if none does."""
+    directory = os.path.abspath(directory)
+    with _registry_lock:
+        for root, index in _indexes.items():
+            if directory == root or directory.startswith(root.rstrip(os.sep) + os.sep):
+                return index
+        index = FileIndex(directory)
+        _indexes[directory] = index
+        return index
+
+
+def _file_changed(entry, current):
+    """Hash cache listener: pass a changed file on to the index that covers it, if any."""
+    path = os.path.abspath(entry.path)
+    with _registry_lock:
+        indexes = [index for root, index in _indexes.items() if path.startswith(root.rstrip(os.sep) + os.sep)]
+    for index in indexes:
+        index.apply_change(entry, current)
+
+
+hash_cache.add_listener(_file_changed)
+
+
+def rebuild_file_index(directory):
+    """Rebuild the index covering ``directory`` from scratch and return its stats."""
+    index = get_file_index(directory)
+    index.build()
+    return index.stats()
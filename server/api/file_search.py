@@ -0,0 +1,134 @@
+import heapq
+import os
+import re
+from collections import defaultdict
+
+TOKEN_SPLIT = re.compile(r"[\W_]+")
+
+# Weights of the ranking signals combined in SearchEngine.score
+NAME_WEIGHT = 1.0
+SEGMENT_WEIGHT = 0.4
+SUBSTRING_BONUS = 0.5
+KEYWORD_WEIGHT = 0.3
+MIN_SCORE = 0.2
+# Streaming crawls keep the first hits rather than the best ones, so they need a stricter cutoff
+STREAM_MIN_SCORE = 0.4
+
+
+def tokenize(text):
+    """Split a name or query into lowercase alphanumeric tokens."""
+    return [token for token in TOKEN_SPLIT.split(text.lower()) if token]
+
+
+def trigrams(text):
+    """Return the set of padded trigrams of every token in ``text``."""
+    grams = set()
+    for token in tokenize(text):
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def dice(a, b):
+    """Dice coefficient between two trigram sets."""
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def score(query, query_grams, keywords, doc):
+    """Combine trigram similarity, substring and keyword matches into one ranking score."""
+    _, name, name_grams, segment_grams = doc
+    value = NAME_WEIGHT * dice(query_grams, name_grams)
+    if segment_grams:
+        value += SEGMENT_WEIGHT * max(dice(query_grams, grams) for grams in segment_grams)
+    if query and query in name:
+        value += SUBSTRING_BONUS
+    if keywords:
+        value += KEYWORD_WEIGHT * sum(keyword in name for keyword in keywords) / len(keywords)
+    return value
+
+
+def name_matcher(query, min_score=STREAM_MIN_SCORE):
+    """Return a predicate accepting crawler entries whose basename scores at least ``min_score``."""
+    query = query.lower().strip()
+    query_grams = trigrams(query)
+    keywords = query.split()
+
+    def match(entry):
+        doc = (entry, entry.name.lower(), trigrams(entry.name), [])
+        return score(query, query_grams, keywords, doc) >= min_score
+
+    return match
+
+
+class SearchEngine:
+    """In-memory trigram inverted index over the basenames and directory segments of one root."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.next_id = 0
+        self.ids = {}
+        self.docs = {}
+        self.postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, entry):
+        """Index a crawler FileEntry, replacing any previous entry for its path."""
+        path = entry.path
+        if path in self.ids:
+            self.remove(path)
+        name = entry.name
+        segments = os.path.relpath(os.path.dirname(path), self.root).split(os.sep)
+        name_grams = trigrams(name)
+        segment_grams = [trigrams(segment) for segment in segments if segment not in ("", ".")]
+
+        doc_id = self.next_id
+        self.next_id += 1
+        self.ids[path] = doc_id
+        # The entry keeps the stat data collected while indexing, so results need no further I/O
+        self.docs[doc_id] = (entry, name.lower(), name_grams, segment_grams)
+        for gram in name_grams.union(*segment_grams):
+            self.postings[gram].add(doc_id)
+
+    def remove(self, path):
+        """Drop a file path from the index if it is present."""
+        doc_id = self.ids.pop(path, None)
+        if doc_id is None:
+            return
+        _, _, name_grams, segment_grams = self.docs.pop(doc_id)
+        for gram in name_grams.union(*segment_grams):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self.postings[gram]
+
+    def search(self, query, max_results=5, directory=None):
+        """Return the FileEntry of the best ``max_results`` matches, optionally limited to ``directory``."""
+        query = query.lower().strip()
+        query_grams = trigrams(query)
+        keywords = query.split()
+
+        # Only documents sharing at least one trigram with the query are ever scored
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for doc_id in self.postings.get(gram, ()):
+                shared[doc_id] += 1
+
+        prefix = None
+        if directory and os.path.abspath(directory) != self.root:
+            prefix = os.path.abspath(directory).rstrip(os.sep) + os.sep
+
+        ranked = []
+        for doc_id in shared:
+            doc = self.docs[doc_id]
+            if prefix and not doc[0].path.startswith(prefix):
+                continue
+            value = score(query, query_grams, keywords, doc)
+            if value >= MIN_SCORE:
+                ranked.append((value, -len(doc[1]), doc_id))
+
+        return [self.docs[doc_id][0] for _, _, doc_id in heapq.nlargest(max_results, ranked)]
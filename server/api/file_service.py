@@ -0,0 +1,347 @@
+import itertools
+import os
+import re
+import socket
+import threading
+from urllib.parse import urlencode
+
+
+from api.cache import LRUCache, normalize_text
+from api.config import settings
+from api.content_index import get_content_index
+from api.crawler import FileEntry, crawl
+from api.download_server import ARCHIVE_PATH, ROOT_PREFIX, DownloadServer
+from api.file_index import get_file_index
+from api.file_search import name_matcher
+from api.hash_cache import file_etag, hash_cache
+from api.llm_gateway import generate
+
+
+# Gemini interpretations of file search requests, keyed by the normalized request
+interpretation_cache = LRUCache(
+    "file_query_interpretation",
+    maxsize=settings.QUERY_CACHE_SIZE,
+    ttl=settings.QUERY_CACHE_TTL,
+    path=os.path.join(settings.CACHE_DIR, "query-cache.sqlite") if settings.QUERY_CACHE_PERSIST else None,
+)
+
+
+class FileServer:
+    def __init__(self, directory=None, port=8000, api_key=None, roots=None, rate_limit=0):
+        """Initialize the file server with a default directory, extra named roots and a port."""
+        self.directory = os.path.abspath(directory) if directory else os.getcwd()
+        self.port = port
+        self.rate_limit = rate_limit
+        self.server = None
+        self.server_thread = None
+        self.ip_address = self.get_local_ip()
+        self.api_key = api_key
+        
+        # Only these directories are ever served or searched: the default directory and FILE_SERVER_ROOTS
+        self.roots = {"": self.directory}
+        for name, path in (roots or {}).items():
+            self.roots[name] = os.path.abspath(path)
+        
+        # Query interpretation goes through the shared LLM gateway; the API key only turns it on
+        self.gemini_enabled = bool(self.api_key)
+        if self.gemini_enabled:
+            print("Gemini AI search enabled")
+            
+    def get_local_ip(self):
+        """Get the local IP address of the machine."""
+        try:
+            # Create a socket to determine the local IP
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.connect(("8.8.8.8", 80))
+            ip = s.getsockname()[0]
+            s.close()
+            return ip
+        except Exception:
+            return "127.0.0.1"  # Fallback to localhost if unable to determine IP
+
+    def start_server(self):
+        """Start the HTTP server in a separate thread."""
+        # The socket is bound and listening once the constructor returns, so no startup wait is needed
+        self.server = DownloadServer(("0.0.0.0", self.port), self.roots, rate_limit=self.rate_limit)
+        
+        # Start the server in a separate thread
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        print(f"Server started at http://{self.ip_address}:{self.port}")
+        return True
+        
+    def stop_server(self):
+        """Stop the HTTP server."""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server_thread.join()
+            print("Server stopped.")
+    
+    def root_of(self, path):
+        """Return the name of the served root containing ``path``, or None if it is outside all of them."""
+        path = os.path.abspath(path)
+        for name, root in self.roots.items():
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return name
+        return None
+    
+    def url_path(self, file_path):
+        """Build the URL path of a file from the root that contains it, or None if no root does."""
+        name = self.root_of(file_path)
+        if name is None:
+            return None
+        rel_path = os.path.relpath(file_path, self.roots[name])
+        
+        # URL encode the file path for proper URL formatting
+        parts = [part.replace(" ", "%20") for part in rel_path.split(os.sep)]
+        if name:
+            parts.insert(0, ROOT_PREFIX + name)
+        return "/".join(parts)
+    
+    def interpret_query_with_gemini(self, natural_query):
+        """Use Gemini to interpret a natural language query into search parameters."""
+        if not self.gemini_enabled:
+            print("Gemini AI not enabled. Using direct search.")
+            return {"query": natural_query, "directory": self.directory}
+        
+        # Repeated phrasings skip the LLM round trip entirely
+        cache_key = normalize_text(natural_query)
+        cached = interpretation_cache.get(cache_key)
+        if cached is not None:
+            return self.resolve_search_directory(dict(cached))
+            
+        try:
+            prompt = f"""
+            Given this natural language request to find a file: "{natural_query}"
+            Extract the following information:
+            1. The file name or keywords to search for
+            2. Any specific directory mentioned (if none, return "default")
+            
+            Format your response as a JSON object with the following structure:
+            {{
+                "query": "search keywords",
+                "directory": "specific directory or 'default'"
+            }}
+            Only return the JSON, without any explanation.
+            """
+            
+            response = generate("gemini-2.0-flash", prompt)
+            
+            # Extract the JSON response
+            response_text = response.text
+            
+            # Try to clean and parse the JSON string
+            try:
+                # Remove any code block markers that might be in the response
+                json_str = re.sub(r'```json|```|\n', '', response_text).strip()
+                
+                # Use Python's eval to convert the string to a dictionary
+                # This is safer than using eval() directly on unknown input
+                import ast
+                result = ast.literal_eval(json_str)
+                
+                # Cache the model's answer as given, since the directory is resolved against this server
+                answer = dict(result)
+                result = self.resolve_search_directory(result)
+                interpretation_cache.set(cache_key, answer)
+                return result
+            except:
+                # Fallback to basic parsing if JSON parsing fails
+                if "file name" in response_text.lower() and ":" in response_text:
+                    keywords = response_text.split(":")[-1].strip()
+                    return {"query": keywords, "directory": self.directory}
+                else:
+                    return {"query": natural_query, "directory": self.directory}
+                    
+        except Exception as e:
+            print(f"Error using Gemini API: {e}")
+            return {"query": natural_query, "directory": self.directory}
+    
+    def resolve_search_directory(self, result):
+        """Turn the directory named by Gemini into an absolute path."""
+        directory = result.get('directory') or 'default'
+        
+        # If directory is 'default', use the current directory
+        if directory == 'default':
+            result['directory'] = self.directory
+        # Handle special cases like "desktop"
+        elif directory.lower() == 'desktop':
+            # Get the user's desktop directory
+            home = os.path.expanduser("~")
+            desktop = os.path.join(home, 'Desktop')
+            if os.path.exists(desktop):
+                result['directory'] = desktop
+        elif not os.path.isabs(directory):
+            # If it's a relative path, make it absolute
+            result['directory'] = os.path.abspath(directory)
+        
+        # Never let the model point the search outside the served roots
+        if self.root_of(result['directory']) is None:
+            print(f"Ignoring search directory outside the served roots: {result['directory']}")
+            result['directory'] = self.directory
+                
+        return result
+    
+    def find_files(self, query, directory=None, max_results=5):
+        """Find files with names similar to the query, as FileEntry tuples carrying their stat data."""
+        return list(self.iter_files(query, directory=directory, max_results=max_results))
+    
+    def iter_files(self, query, directory=None, max_results=5):
+        """Yield FileEntry tuples of files with names similar to the query as soon as they are found."""
+        search_dir = os.path.abspath(directory if directory else self.directory)
+        if self.root_of(search_dir) is None:
+            print(f"Refusing to search outside the served roots: {search_dir}")
+            return
+        
+        # Read the candidates from the persistent index instead of walking the disk
+        index = get_file_index(search_dir)
+        if not index.is_built():
+            # Cold index: build it in the background and stream the first hits from a parallel crawl
+            index.build_in_background()
+            matches = crawl(search_dir, match=name_matcher(query))
+            try:
+                yield from itertools.islice(matches, max_results)
+            finally:
+                matches.close()
+            return
+        
+        index.ensure_current()
+        # Rank candidates with the trigram engine; substring and keyword hits are scored inside it
+        yield from index.search(query, directory=search_dir, max_results=max_results)
+    
+    def find_contents(self, query, directory=None, max_results=5):
+        """Find documents whose text matches the query, with a highlighted snippet for each."""
+        search_dir = os.path.abspath(directory if directory else self.directory)
+        if self.root_of(search_dir) is None:
+            print(f"Refusing to search outside the served roots: {search_dir}")
+            return []
+        index = get_content_index(search_dir)
+        
+        # Indexing runs on a background pool; search whatever has been indexed so far
+        index.schedule_update()
+        return index.search(query, directory=search_dir, max_results=max_results)
+    
+    def share_files(self, natural_query):
+        """Run a file sharing request, yielding (event, data) pairs as each stage produces results.
+        
+        Emits one "query" event with the interpreted search, a "file" event per matching
+        file with its download link, and a closing "summary" event.
+        """
+        # Interpret the query with Gemini if available
+        search_params = self.interpret_query_with_gemini(natural_query)
+        search_directory = search_params.get("directory")
+        search_query = search_params.get("query")
+        yield "query", {"directory": search_directory, "search_query": search_query}
+        
+        # Stream matching files with their links as they are found
+        found = {}
+        for entry in self.iter_files(search_query, directory=search_directory):
+            for link in self.generate_download_links([entry]):
+                found[entry.path] = True
+                yield "file", link
+        
+        # Add documents that mention the query in their text
+        if settings.CONTENT_INDEX_ENABLED:
+            hits = [hit for hit in self.find_contents(search_query, directory=search_directory) if hit["path"] not in found]
+            # Reuse the stat data already in the filename index instead of stat-ing each hit
+            entries = get_file_index(search_directory or self.directory).lookup([hit["path"] for hit in hits])
+            for hit in hits:
+                for link in self.generate_download_links([entries.get(hit["path"], hit["path"])]):
+                    found[hit["path"]] = True
+                    link["snippet"] = hit["snippet"]
+                    yield "file", link
+        
+        if found:
+            summary = {"status": "success", "message": f"Found {len(found)} files matching '{search_query}'"}
+        else:
+            summary = {"status": "not_found", "message": f"No files matching '{search_query}' were found"}
+        summary.update({"directory": search_directory, "search_query": search_query})
+        if len(found) > 1:
+            summary["download_all"] = self.generate_archive_link(found)
+        yield "summary", summary
+    
+    def generate_download_links(self, files):
+        """Generate download links for the matched files.
+        
+        ``files`` holds FileEntry tuples, whose stat data is used as-is, or plain paths,
+        which are stat-ed once each.
+        """
+        links = []
+        base_url = f"http://{self.ip_address}:{self.port}"
+        
+        for entry in files:
+            path = entry if isinstance(entry, str) else entry.path
+            url_path = self.url_path(path)
+            if url_path is None:
+                # Files outside the served roots are never linked
+                continue
+            if isinstance(entry, str):
+                try:
+                    st = os.stat(entry)
+                except OSError:
+                    continue
+                entry = FileEntry(entry, os.path.basename(entry), st.st_size, st.st_mtime_ns, st.st_ino)
+            link = f"{base_url}/{url_path}"
+            
+            links.append({
+                "name": entry.name,
+                "path": entry.path,
+                "size": format_file_size(entry.size),
+                "url": link,
+                "etag": file_etag(entry.size, entry.mtime_ns, entry.inode),
+                # None until the background hasher has seen this version of the file
+                "sha256": hash_cache.get(entry),
+            })
+            
+        return links
+
+    def generate_archive_link(self, files):
+        """Generate one link that streams a ZIP of all the given file paths."""
+        paths = [self.url_path(path) for path in files]
+        query = urlencode([("f", path) for path in paths if path is not None])
+        return f"http://{self.ip_address}:{self.port}{ARCHIVE_PATH}?{query}"
+
+def format_file_size(size_bytes):
+    """Format file size in bytes to human-readable format."""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+# Shared file server instance, reused by every request
+file_server = None
+file_server_lock = threading.Lock()
+
+def get_file_server():
+    """Return the running file server, starting it once and restarting it only when its config changes."""
+    global file_server
+    
+    # Use environment variables if available
+    directory = os.path.abspath(os.environ.get("FILE_SERVER_DIR", os.getcwd()))
+    port = int(os.environ.get("FILE_SERVER_PORT", 7056))
+    api_key = os.environ.get("GEMINI_API_KEY", None)
+    roots = settings.FILE_SERVER_ROOTS
+    rate_limit = settings.FILE_SERVER_RATE_LIMIT
+    config = (directory, port, api_key, tuple(sorted(roots.items())), rate_limit)
+    
+    with file_server_lock:
+        if file_server and file_server.config == config:
+            return file_server
+        if file_server:
+            print("File server config changed, restarting")
+            file_server.stop_server()
+        file_server = FileServer(directory=directory, port=port, api_key=api_key, roots=roots, rate_limit=rate_limit)
+        file_server.config = config
+        file_server.start_server()
+        return file_server
+
+def shutdown_file_server():
+    """Stop the shared file server if it is running."""
+    global file_server
+    with file_server_lock:
+        if file_server:
+            file_server.stop_server()
+            file_server = None
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from api import metrics
+from api.config import settings
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_etag(size, mtime_ns, inode):
+    """Build the ETag of a file version from its stat data, identical for links and downloads."""
+    return f'"{inode:x}-{size:x}-{mtime_ns:x}"'
+
+
+def sha256_file(path):
+    """Hash a file in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """SHA-256 checksums keyed by (inode, mtime, size), computed on a background pool.
+
+    Lookups never hash on the calling thread: an unknown file returns None and is queued,
+    and later lookups of the same unchanged file find its checksum. A queued file that changed
+    since it was indexed is hashed as it is now, and listeners are told about its new stat data.
+    """
+
+    def __init__(self, path=None, workers=1):
+        path = path or os.path.join(settings.CACHE_DIR, "hash-cache.sqlite")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "inode INTEGER, mtime_ns INTEGER, size INTEGER, sha256 TEXT, PRIMARY KEY (inode, mtime_ns, size))"
+        )
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.hits = 0
+        self.misses = 0
+        self.listeners = []
+        metrics.register("cache.file_hash", self.stats)
+
+    def get(self, entry):
+        """Return the cached checksum of a FileEntry, queueing it for hashing if it is unknown."""
+        key = (entry.inode, entry.mtime_ns, entry.size)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sha256 FROM hashes WHERE inode = ? AND mtime_ns = ? AND size = ?", key
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            if key not in self.pending and entry.size <= settings.HASH_CACHE_MAX_BYTES:
+                self.pending.add(key)
+                self.pool.submit(self._compute, entry, key)
+        return None
+
+    def stats(self):
+        """Return hit/miss counters and the number of files waiting to be hashed."""
+        return {"hits": self.hits, "misses": self.misses, "pending": len(self.pending)}
+
+    def add_listener(self, listener):
+        """Call ``listener(entry, current)`` when a queued file turns out to have changed or gone.
+
+        ``current`` is the FileEntry with fresh stat data, or None if the file no longer exists.
+        """
+        self.listeners.append(listener)
+
+    def observe(self, entry):
+        """Record the stat data of a file version a download actually served.
+
+        Listeners are told, so index rows of files changed in place catch up, and the
+        served version is queued for hashing if it is unknown.
+        """
+        self._notify(entry, entry)
+        self.get(entry)
+
+    def _compute(self, entry, key):
+        try:
+            try:
+                st = os.stat(entry.path)
+            except FileNotFoundError:
+                self._notify(entry, None)
+                return
+            current_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if current_key != key:
+                # Changed since it was indexed: hash the version on disk, which is what downloads serve
+                self._notify(entry, entry._replace(size=st.st_size, mtime_ns=st.st_mtime_ns, inode=st.st_ino))
+            checksum = sha256_file(entry.path)
+            with self.lock:
+                self.conn.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", current_key + (checksum,))
+                self.conn.commit()
+        except OSError as e:
+            print(f"Error hashing {entry.path}: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def _notify(self, entry, current):
+        for listener in self.listeners:
+            try:
+                listener(entry, current)
+            except Exception as e:
+                print(f"Error reporting change of {entry.path}: {e}")
+
+
+hash_cache = HashCache()
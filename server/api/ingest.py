@@ -0,0 +1,106 @@
+import json
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pydantic import ValidationError
+
+from api.config import settings
+from api.models import IngestRecord
+from api.pinecone_utils import upsert_vectors
+from api.rate_limiter import Priority, priority
+from api.utils import gemini_embed_batch
+
+
+class Checkpoint:
+    """IDs already upserted by an ingest job, saved to disk so an interrupted job can resume."""
+
+    def __init__(self, job_id):
+        safe_id = re.sub(r"[^\w.-]", "_", job_id)
+        self.path = os.path.join(settings.CACHE_DIR, "ingest", f"{safe_id}.json")
+        self.done = set()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.done = set(json.load(f).get("done", []))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+
+def parse_records(lines):
+    """Parse NDJSON lines into IngestRecords, returning (records, failures)."""
+    records = []
+    failures = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            records.append(IngestRecord.model_validate_json(line))
+        except ValidationError as e:
+            failures.append({"line": number, "error": str(e)})
+    return records, failures
+
+
+def _upsert(vectors, namespace):
+    upsert_vectors(vectors, namespace=namespace)
+    return [vector["id"] for vector in vectors]
+
+
+def ingest_records(records, job_id, namespace=None, failures=None):
+    """Embed and upsert records in batches, yielding progress events and a final summary.
+
+    Records already recorded in the job's checkpoint are skipped. The record text is also
+    stored as the ``example`` metadata field unless the record sets one, since that is the
+    field retrieval reads.
+    """
+    namespace = namespace or settings.PINECONE_NAMESPACE
+    checkpoint = Checkpoint(job_id)
+    failures = list(failures or [])
+    pending = [record for record in records if record.id not in checkpoint.done]
+    progress = {"job_id": job_id, "total": len(records), "skipped": len(records) - len(pending), "upserted": 0}
+
+    def collect(done_futures):
+        for future in done_futures:
+            chunk = in_flight.pop(future)
+            try:
+                ids = future.result()
+                checkpoint.done.update(ids)
+                progress["upserted"] += len(ids)
+            except Exception as e:
+                failures.extend({"id": vector["id"], "error": f"upsert failed: {e}"} for vector in chunk)
+        checkpoint.save()
+
+    pool = ThreadPoolExecutor(max_workers=settings.INGEST_PARALLELISM)
+    in_flight = {}
+    try:
+        for start in range(0, len(pending), settings.EMBED_BATCH_SIZE):
+            batch = pending[start:start + settings.EMBED_BATCH_SIZE]
+            vectors = []
+            with priority(Priority.BULK):
+                embeddings = gemini_embed_batch([record.text for record in batch])
+            for record, values in zip(batch, embeddings):
+                if values is None:
+                    failures.append({"id": record.id, "error": "embedding failed"})
+                    continue
+                metadata = dict(record.metadata)
+                metadata.setdefault("example", record.text)
+                vectors.append({"id": record.id, "values": values, "metadata": metadata})
+
+            # Upserts overlap with embedding the next batch, bounded by INGEST_PARALLELISM
+            for chunk_start in range(0, len(vectors), settings.UPSERT_CHUNK_SIZE):
+                if len(in_flight) >= settings.INGEST_PARALLELISM:
+                    collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                chunk = vectors[chunk_start:chunk_start + settings.UPSERT_CHUNK_SIZE]
+                in_flight[pool.submit(_upsert, chunk, namespace)] = chunk
+
+            yield "progress", dict(progress, embedded=min(start + len(batch), len(pending)), failed=len(failures))
+
+        collect(wait(in_flight).done)
+    finally:
+        pool.shutdown(wait=True)
+
+    yield "summary", dict(progress, failed=len(failures), failures=failures)
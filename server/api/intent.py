@@ -0,0 +1,187 @@
+import json
+import re
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from api import metrics
+from api.async_io import run_blocking
+from api.config import settings
+from api.utils import gemini_embed_batch, gemini_embed_text
+
+# ``confident`` intents are answered locally; the others only record what the LLM decides
+Intent = namedtuple("Intent", ["action", "score", "source", "confident"])
+
+NO_INTENT = Intent(None, 0.0, None, False)
+
+# Patterns checked before the embedding classifier; the first match wins.
+# Filesharing needs a possessive or a local location, so web searches and downloads go to the LLM.
+RULES = [
+    (re.compile(r"\b(explain|describe|what(?:'s| is)( on)?)\b.*\b(my|this|the) screen\b"), "Explain a Screen"),
+    (re.compile(r"\b(explain|describe|summari[sz]e|what(?:'s| is))\b.*\b(this|the|that) (website|web ?page|site)\b"), "Explain a Website"),
+    (re.compile(
+        r"\b(find|search for|look for|share|send me|get me)\b"
+        r"(?=.*\b(files?|documents?|pdfs?|folders?|photos?|spreadsheets?)\b)"
+        r"(?=.*\b(my|our|on (this|the) (computer|laptop|pc|drive)|in the \w+ folder)\b)"
+    ), "Filesharing"),
+]
+
+# Labeled requests whose embeddings are averaged into one centroid per action
+LABELED_EXAMPLES = {
+    "General Task": [
+        "open notepad",
+        "create a new folder on the desktop called projects",
+        "set a timer for ten minutes",
+        "open youtube in the browser",
+        "turn up the volume",
+        "take a screenshot",
+    ],
+    "Explain a Website": [
+        "explain this website",
+        "what does this web page do",
+        "summarize the site I have open",
+        "tell me what this page is about",
+        "how does this website work",
+    ],
+    "Explain a Screen": [
+        "explain what is on my screen",
+        "what am I looking at right now",
+        "describe the window that is open",
+        "what does this error on my screen mean",
+        "help me understand this screen",
+    ],
+    "Filesharing": [
+        "find my resume and share it",
+        "send me the budget spreadsheet",
+        "look for the presentation in my documents folder",
+        "share the photos from the trip",
+        "where is the pdf I downloaded yesterday",
+    ],
+}
+
+FAST_PATH_MESSAGES = {
+    "General Task": "On it.",
+    "Explain a Website": "Let me take a look at the website.",
+    "Explain a Screen": "Let me take a look at your screen.",
+    "Filesharing": "Let me find that for you.",
+}
+
+
+def fast_path_reply(intent, query: str) -> str:
+    """Build a router reply for a locally classified query, shaped like the LLM's JSON."""
+    return json.dumps({
+        "Message": FAST_PATH_MESSAGES.get(intent.action, "On it."),
+        "Routing": {"Action": intent.action, "Details": query},
+    })
+
+
+class IntentClassifier:
+    """Local routing stage in front of the router LLM: rules, then nearest centroid over embeddings.
+
+    Centroids are built in the background from LABELED_EXAMPLES on first use, so the
+    embedding stage only starts answering once they are ready.
+    """
+
+    def __init__(self, examples, min_score=0.75, min_margin=0.05):
+        self.examples = examples
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.labels = []
+        self.centroids = None
+        self.building = False
+        self.lock = threading.Lock()
+        self.counts = {"rules": 0, "centroid": 0, "fallback": 0, "agree": 0, "disagree": 0}
+        metrics.register("intent", self.stats)
+
+    async def classify(self, query: str):
+        """Return the local intent for ``query``; it is ``confident`` when the LLM can be skipped."""
+        intent = self.match_rules(query)
+        if intent is None:
+            intent = await self.match_centroid(query)
+        self.counts[intent.source if intent.confident else "fallback"] += 1
+        return intent
+
+    def match_rules(self, query: str):
+        text = query.lower()
+        for pattern, action in RULES:
+            if pattern.search(text):
+                return Intent(action, 1.0, "rules", True)
+        return None
+
+    async def match_centroid(self, query: str):
+        if self.centroids is None:
+            self._build_in_background()
+            return NO_INTENT
+        vector = await run_blocking("embedding", gemini_embed_text, query)
+        if vector is None:
+            return NO_INTENT
+        vector = np.asarray(vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        scores = self.centroids @ vector
+        order = np.argsort(-scores)
+        best = float(scores[order[0]])
+        margin = best - float(scores[order[1]]) if len(order) > 1 else best
+        confident = best >= self.min_score and margin >= self.min_margin
+        return Intent(self.labels[order[0]], best, "centroid", confident)
+
+    def compare(self, intent, llm_action):
+        """Record whether the local guess matches the action the LLM chose."""
+        if intent.action is None or llm_action is None:
+            return
+        key = "agree" if intent.action == llm_action else "disagree"
+        self.counts[key] += 1
+        metrics.incr(f"intent.{key}.{intent.source}")
+
+    def stats(self):
+        """Return fast-path hit rate and agreement with the LLM."""
+        total = self.counts["rules"] + self.counts["centroid"] + self.counts["fallback"]
+        compared = self.counts["agree"] + self.counts["disagree"]
+        return dict(
+            self.counts,
+            ready=self.centroids is not None,
+            hit_rate=(self.counts["rules"] + self.counts["centroid"]) / total if total else 0.0,
+            disagreement_rate=self.counts["disagree"] / compared if compared else 0.0,
+        )
+
+    def warm_up(self):
+        """Build the centroids now instead of on the first request that needs them."""
+        with self.lock:
+            if self.centroids is not None or self.building:
+                return
+            self.building = True
+        self._build()
+
+    def _build_in_background(self):
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(target=self._build, daemon=True).start()
+
+    def _build(self):
+        try:
+            labels = []
+            centroids = []
+            for label, texts in self.examples.items():
+                vectors = [vector for vector in gemini_embed_batch(texts) if vector is not None]
+                if not vectors:
+                    continue
+                rows = np.asarray(vectors, dtype=np.float32)
+                rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+                centroid = rows.mean(axis=0)
+                centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+                labels.append(label)
+            if len(labels) == len(self.examples):
+                self.labels = labels
+                self.centroids = np.vstack(centroids)
+        except Exception as e:
+            print(f"Error building intent centroids: {e}")
+        finally:
+            # Failed builds are retried on a later request
+            self.building = False
+
+
+intent_classifier = IntentClassifier(
+    LABELED_EXAMPLES, min_score=settings.INTENT_MIN_SCORE, min_margin=settings.INTENT_MIN_MARGIN
+)
@@ -0,0 +1,386 @@
+import asyncio
+import contextvars
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from api import metrics, startup
+from api.config import settings
+from api.rate_limiter import current_priority, rate_limiter
+from api.singleflight import SingleFlight, call_key
+
+# Rate limiting and transient server errors are retried; everything else fails at once
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a gateway call cannot finish before the current deadline."""
+
+
+@contextmanager
+def deadline(seconds):
+    """Make every gateway call inside the block finish within ``seconds``; nested deadlines only tighten."""
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(min(at, current) if current else at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Return the seconds one call may take: the time left before the deadline, at most LLM_TIMEOUT."""
+    at = _deadline.get()
+    if at is None:
+        return settings.LLM_TIMEOUT
+    left = at - time.monotonic()
+    if left <= 0:
+        metrics.incr("llm.deadline_exceeded")
+        raise DeadlineExceeded("LLM deadline exceeded")
+    return min(left, settings.LLM_TIMEOUT)
+
+
+class _Waiter:
+    __slots__ = ("granted", "notify")
+
+    def __init__(self, notify):
+        self.granted = False
+        self.notify = notify
+
+
+class ModelLimiter:
+    """Concurrency limit for one model, shared by threads and event-loop callers.
+
+    A released slot is handed straight to the oldest waiter, so sync and async
+    callers are served in arrival order.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.lock = threading.Lock()
+        self.waiters = deque()
+
+    def acquire(self, timeout=None):
+        """Wait up to ``timeout`` seconds for a slot on a thread; return whether one was taken."""
+        event = threading.Event()
+        with self.lock:
+            if self.active < self.limit and not self.waiters:
+                self.active += 1
+                return True
+            waiter = _Waiter(event.set)
+            self.waiters.append(waiter)
+        event.wait(timeout)
+        return self._settle(waiter)
+
+    async def acquire_async(self, timeout=None):
+        """Wait up to ``timeout`` seconds for a slot on the event loop; return whether one was taken."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.lock:
+            if self.active < self.limit and not self.waiters:
+                self.active += 1
+                return True
+            waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+            self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if self._settle(waiter):
+                self.release()
+            raise
+        return self._settle(waiter)
+
+    def release(self):
+        """Free a slot, handing it to the oldest waiter if there is one."""
+        with self.lock:
+            if self.waiters:
+                waiter = self.waiters.popleft()
+                waiter.granted = True
+                waiter.notify()
+            else:
+                self.active -= 1
+
+    def stats(self):
+        return {"limit": self.limit, "active": self.active, "waiting": len(self.waiters)}
+
+    def _settle(self, waiter):
+        """Return whether a waiter got its slot, withdrawing it from the queue if not."""
+        with self.lock:
+            if not waiter.granted:
+                self.waiters.remove(waiter)
+            return waiter.granted
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(model):
+    """Return the concurrency limiter of ``model``."""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = ModelLimiter(settings.LLM_MODEL_CONCURRENCY.get(model, settings.LLM_CONCURRENCY))
+        return _limiters[model]
+
+
+def stats():
+    """Return the concurrency state of every model used so far."""
+    with _limiters_lock:
+        return {model: model_limiter.stats() for model, model_limiter in _limiters.items()}
+
+
+metrics.register("llm_gateway", stats)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared Gemini client, creating it on first use.
+
+    One client serves the whole server, so every call reuses the same keep-alive connection
+    pool. The gateway does its own retries, so the SDK's are turned off.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            if not settings.GOOGLE_API_KEY:
+                raise RuntimeError("GOOGLE_API_KEY is not set; Gemini calls are unavailable")
+            with startup.timed("genai"):
+                import httpx
+                from google import genai
+                from google.genai import types
+
+                pool_limits = httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS, max_keepalive_connections=settings.LLM_MAX_CONNECTIONS
+                )
+                _client = genai.Client(
+                    api_key=settings.GOOGLE_API_KEY,
+                    http_options=types.HttpOptions(
+                        timeout=int(settings.LLM_TIMEOUT * 1000),
+                        client_args={"limits": pool_limits},
+                        async_client_args={"limits": pool_limits},
+                        retry_options=types.HttpRetryOptions(attempts=1),
+                    ),
+                )
+        return _client
+
+
+def _is_retryable(error):
+    import httpx
+
+    if isinstance(error, httpx.TransportError):
+        return True
+    try:
+        return int(getattr(error, "code", None)) in RETRY_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff, so retrying callers do not hit the API in lockstep."""
+    return random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _retry_delay(model, attempt, error):
+    """Return how long to wait before retrying a failed call, or None if it should not be retried."""
+    if attempt >= settings.LLM_MAX_RETRIES or not _is_retryable(error):
+        return None
+    delay = _backoff(attempt)
+    at = _deadline.get()
+    if at is not None and time.monotonic() + delay >= at:
+        return None
+    metrics.incr(f"llm.{model}.retries")
+    return delay
+
+
+def _with_timeout(config, timeout, config_type):
+    """Copy a request config, a ``config_type`` from google.genai.types, with its HTTP timeout set to ``timeout`` seconds."""
+    from google.genai import types
+
+    config_type = getattr(types, config_type)
+    if config is None:
+        config = config_type()
+    elif isinstance(config, dict):
+        config = config_type(**config)
+    else:
+        config = config.model_copy()
+    config.http_options = types.HttpOptions(timeout=int(timeout * 1000))
+    return config
+
+
+def _record(model, response, seconds):
+    """Record the latency and token usage of a successful call."""
+    metrics.incr(f"llm.{model}.calls")
+    metrics.observe(f"llm.{model}", seconds)
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    if prompt_tokens:
+        metrics.record("llm.prompt_tokens", prompt_tokens)
+        metrics.record(f"llm.{model}.prompt_tokens", prompt_tokens)
+        # File latency under a power-of-two prompt size band, to relate prompt size to response time
+        band = 256
+        while band < prompt_tokens:
+            band *= 2
+        metrics.observe(f"llm.latency.prompt_le_{band}", seconds)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if output_tokens:
+        metrics.record(f"llm.{model}.output_tokens", output_tokens)
+
+
+def estimate_tokens(contents, config=None):
+    """Approximate the prompt tokens of a request at four characters per token, for TPM budgeting."""
+    size = len(json.dumps(contents, default=str))
+    instruction = config.get("system_instruction") if isinstance(config, dict) else getattr(config, "system_instruction", None)
+    return (size + len(str(instruction or ""))) // 4 + 1
+
+
+def _settle(model, reserved, response):
+    """Charge the rate limiter for the tokens a call actually used, once they are known."""
+    usage = getattr(response, "usage_metadata", None)
+    used = getattr(usage, "total_token_count", None)
+    if used:
+        rate_limiter(model).settle(reserved, used)
+
+
+def _call(model, fn, tokens, priority):
+    """Run a blocking SDK call within the model's rate budget and limit, the deadline and the retry policy."""
+    model_limiter = limiter(model)
+    attempt = 0
+    while True:
+        rate_limiter(model).acquire(tokens, priority, remaining())
+        if not model_limiter.acquire(remaining()):
+            metrics.incr("llm.deadline_exceeded")
+            raise DeadlineExceeded(f"No {model} slot before the deadline")
+        start = time.perf_counter()
+        try:
+            response = fn(remaining())
+        except Exception as e:
+            metrics.incr(f"llm.{model}.errors")
+            delay = _retry_delay(model, attempt, e)
+            if delay is None:
+                raise
+        else:
+            _record(model, response, time.perf_counter() - start)
+            _settle(model, tokens, response)
+            return response
+        finally:
+            model_limiter.release()
+        attempt += 1
+        time.sleep(delay)
+
+
+async def _call_async(model, fn, tokens, priority, limited=True):
+    """Await an async SDK call within the model's rate budget and limit, the deadline and the retry policy."""
+    model_limiter = limiter(model)
+    attempt = 0
+    while True:
+        await rate_limiter(model).acquire_async(tokens, priority, remaining())
+        if limited and not await model_limiter.acquire_async(remaining()):
+            metrics.incr("llm.deadline_exceeded")
+            raise DeadlineExceeded(f"No {model} slot before the deadline")
+        start = time.perf_counter()
+        try:
+            timeout = remaining()
+            response = await asyncio.wait_for(fn(timeout), timeout)
+        except Exception as e:
+            metrics.incr(f"llm.{model}.errors")
+            delay = _retry_delay(model, attempt, e)
+            if delay is None:
+                raise
+        else:
+            if limited:
+                _record(model, response, time.perf_counter() - start)
+                _settle(model, tokens, response)
+            return response
+        finally:
+            if limited:
+                model_limiter.release()
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+# Identical requests already in flight share one upstream call
+_flight = SingleFlight("llm")
+
+
+def _coalesced(kind, model, contents, config, fn):
+    if not settings.LLM_SINGLEFLIGHT:
+        return fn()
+    return _flight.do(call_key(kind, model, contents, config), fn)
+
+
+async def _coalesced_async(kind, model, contents, config, fn):
+    if not settings.LLM_SINGLEFLIGHT:
+        return await fn()
+    return await _flight.do_async(call_key(kind, model, contents, config), fn)
+
+
+def generate(model, contents, config=None, priority=None):
+    """Generate content from a thread, scheduled under ``priority`` (the context's by default)."""
+    def call(timeout):
+        return get_client().models.generate_content(
+            model=model, contents=contents, config=_with_timeout(config, timeout, "GenerateContentConfig"),
+        )
+    tokens = estimate_tokens(contents, config)
+    priority = current_priority() if priority is None else priority
+    return _coalesced("generate", model, contents, config, lambda: _call(model, call, tokens, priority))
+
+
+async def generate_async(model, contents, config=None, priority=None):
+    """Generate content on the event loop, scheduled under ``priority`` (the context's by default)."""
+    def call(timeout):
+        return get_client().aio.models.generate_content(
+            model=model, contents=contents, config=_with_timeout(config, timeout, "GenerateContentConfig"),
+        )
+    tokens = estimate_tokens(contents, config)
+    priority = current_priority() if priority is None else priority
+    return await _coalesced_async("generate", model, contents, config, lambda: _call_async(model, call, tokens, priority))
+
+
+async def generate_stream(model, contents, config=None, priority=None):
+    """Yield response chunks as they are generated; only opening the stream is retried."""
+    tokens = estimate_tokens(contents, config)
+    priority = current_priority() if priority is None else priority
+    model_limiter = limiter(model)
+    if not await model_limiter.acquire_async(remaining()):
+        metrics.incr("llm.deadline_exceeded")
+        raise DeadlineExceeded(f"No {model} slot before the deadline")
+    start = time.perf_counter()
+    try:
+        stream = await _call_async(model, lambda timeout: get_client().aio.models.generate_content_stream(
+            model=model, contents=contents, config=_with_timeout(config, timeout, "GenerateContentConfig"),
+        ), tokens, priority, limited=False)
+        chunk = None
+        async for chunk in stream:
+            yield chunk
+        # The last chunk carries the usage of the whole response
+        _record(model, chunk, time.perf_counter() - start)
+        _settle(model, tokens, chunk)
+    finally:
+        model_limiter.release()
+
+
+def embed(model, contents, config=None, priority=None):
+    """Embed one text or a list of texts from a thread, scheduled under ``priority`` (the context's by default)."""
+    def call(timeout):
+        return get_client().models.embed_content(
+            model=model, contents=contents, config=_with_timeout(config, timeout, "EmbedContentConfig"),
+        )
+    tokens = estimate_tokens(contents)
+    priority = current_priority() if priority is None else priority
+    return _coalesced("embed", model, contents, config, lambda: _call(model, call, tokens, priority))
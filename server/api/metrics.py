@@ -0,0 +1,53 @@
+import threading
+from collections import defaultdict
+
+_providers = {}
+_counters = defaultdict(int)
+_timings = {}
+_values = {}
+_lock = threading.Lock()
+
+
+def register(name, provider):
+    """Register a callable returning a stats dict, reported under ``name``."""
+    with _lock:
+        _providers[name] = provider
+
+
+def incr(name, amount=1):
+    """Add ``amount`` to a named counter."""
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, seconds):
+    """Record one duration sample for a named timing."""
+    with _lock:
+        count, total, longest = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = (count + 1, total + seconds, max(longest, seconds))
+
+
+def record(name, value):
+    """Record one sample of a named quantity, such as a prompt size."""
+    with _lock:
+        count, total, largest = _values.get(name, (0, 0, 0))
+        _values[name] = (count + 1, total + value, max(largest, value))
+
+
+def snapshot():
+    """Collect the current counters, timings and the stats of every registered provider."""
+    with _lock:
+        providers = dict(_providers)
+        result = {
+            "counters": dict(_counters),
+            "timings": {
+                name: {"count": count, "avg_ms": total / count * 1000, "max_ms": longest * 1000}
+                for name, (count, total, longest) in _timings.items()
+            },
+            "values": {
+                name: {"count": count, "avg": total / count, "max": largest}
+                for name, (count, total, largest) in _values.items()
+            },
+        }
+    result.update({name: provider() for name, provider in providers.items()})
+    return result
@@ -1,8 +1,10 @@
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 
 class UserQuery(BaseModel):
     query: str
+    # Router conversation to continue; also accepted as an X-Session-Id header
+    session_id: Optional[str] = None
 
 class EmbeddingRequest(BaseModel):
     text: str
@@ -16,9 +18,29 @@ class PineconeStoreRequest(BaseModel):
     vector: List[float]
     metadata: Dict[str, Optional[str]] = {}
 
+class IngestRecord(BaseModel):
+    id: str
+    text: str
+    metadata: Dict[str, Any] = {}
+
 class CommandRequest(BaseModel):
     command: str
     details: Optional[str] = None
+    # The user's own request text; retrieval and the command cache are keyed on it
+    query: Optional[str] = None
+    # Key returned by /router/ in the X-Request-Key header, to reuse its speculative retrieval
+    request_key: Optional[str] = None
+
+class IndexRebuildRequest(BaseModel):
+    directory: Optional[str] = None
+
+class CodeCacheInvalidateRequest(BaseModel):
+    query: Optional[str] = None
+    model: Optional[str] = None
+
+class CodeRunRequest(BaseModel):
+    query: str
+    model: Optional[str] = None
 
 class RoutingDetails(BaseModel):
     Action: str
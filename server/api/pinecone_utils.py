@@ -1,24 +1,74 @@
-from pinecone import Pinecone
+import threading
+from api import startup
 from api.config import settings
+from api.vector_store import LocalVectorStore, PineconeVectorStore
+from api.semantic_cache import command_cache
+from api.context_builder import context_cache
 
-# Initialize Pinecone
-pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-pinecone_index = pc.Index(settings.PINECONE_INDEX_NAME)
+# Clients are created on first use, so importing this module never touches the network
+_pinecone_index = None
+_local_store = None
+_vector_store = None
+_lock = threading.RLock()
+
+def get_pinecone_index():
+    """Returns the Pinecone index, connecting on first use."""
+    global _pinecone_index
+    with _lock:
+        if _pinecone_index is None:
+            if not settings.PINECONE_API_KEY:
+                raise RuntimeError("PINECONE_API_KEY is not set; the Pinecone index is unavailable")
+            with startup.timed("pinecone"):
+                from pinecone import Pinecone
+                pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+                _pinecone_index = pc.Index(settings.PINECONE_INDEX_NAME)
+        return _pinecone_index
+
+def get_local_store():
+    """Returns the local vector store, or None when settings.VECTOR_STORE is not "local"."""
+    global _local_store
+    if settings.VECTOR_STORE != "local":
+        return None
+    with _lock:
+        if _local_store is None:
+            with startup.timed("local_store"):
+                _local_store = LocalVectorStore(settings.PINECONE_NAMESPACE)
+            # A fresh local store starts empty; fill it from Pinecone without holding up the caller
+            if not len(_local_store):
+                threading.Thread(target=sync_local_store, daemon=True).start()
+        return _local_store
+
+def get_vector_store():
+    """Returns the retrieval backend selected by settings.VECTOR_STORE."""
+    global _vector_store
+    with _lock:
+        if _vector_store is None:
+            _vector_store = get_local_store() or PineconeVectorStore(get_pinecone_index())
+        return _vector_store
 
 def search_pinecone(vector: list, top_k: int = 5):
-    """Searches the Pinecone index using a vector."""
+    """Searches the configured vector store using a vector."""
     try:
-        results = pinecone_index.query(
-            vector=vector, top_k=top_k, namespace=settings.PINECONE_NAMESPACE, include_metadata=True
-        )
-        return results
+        return get_vector_store().query(vector, top_k=top_k, namespace=settings.PINECONE_NAMESPACE)
     except Exception as e:
         raise Exception(f"Pinecone search error: {e}")
 
+def upsert_vectors(vectors: list, namespace: str = None):
+    """Upserts vectors into Pinecone and mirrors them into the local store when it serves that namespace."""
+    namespace = namespace or settings.PINECONE_NAMESPACE
+    get_pinecone_index().upsert(vectors=vectors, namespace=namespace)
+    local_store = get_local_store()
+    if local_store is not None and namespace == local_store.namespace:
+        local_store.upsert(vectors)
+    # New command examples can change the best command for a cached query
+    if namespace == settings.PINECONE_NAMESPACE:
+        command_cache.invalidate()
+        context_cache.invalidate()
+
 def store_in_pinecone(id: str, vector: list, metadata: dict = {}):
     """Stores a vector in the Pinecone index."""
     try:
-        pinecone_index.upsert(vectors=[{
+        upsert_vectors([{
             "id": id,
             "values": vector,
             "metadata": metadata
@@ -26,3 +76,12 @@ def store_in_pinecone(id: str, vector: list, metadata: dict = {}):
         return {"message": "Vector stored successfully"}
     except Exception as e:
         raise Exception(f"Pinecone store error: {e}")
+
+def sync_local_store():
+    """Pulls the task-commands namespace from Pinecone into the local store."""
+    store = get_local_store() or LocalVectorStore(settings.PINECONE_NAMESPACE)
+    count = store.sync_from(get_pinecone_index())
+    command_cache.invalidate()
+    context_cache.invalidate()
+    return {"namespace": store.namespace, "vectors": count}
+
@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+
+from api import metrics
+from api.config import settings
+
+
+class Priority(IntEnum):
+    """Scheduling classes for LLM and embedding calls; lower values are served first."""
+
+    INTERACTIVE = 0
+    RETRIEVAL = 1
+    CODEGEN = 2
+    BULK = 3
+
+
+class QueueTimeout(TimeoutError):
+    """Raised when a call would not get its rate-limit turn before its deadline."""
+
+
+_priority = contextvars.ContextVar("llm_priority", default=Priority.RETRIEVAL)
+
+
+@contextmanager
+def priority(value):
+    """Schedule the gateway calls made inside the block under ``value``."""
+    token = _priority.set(value)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units evenly over a minute, holding at most one minute's worth.
+
+    A budget of 0 means unlimited. The level may go negative when a call used more than
+    was reserved for it, which delays the calls after it.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def cost(self, amount):
+        """Clamp a cost to the capacity, so one oversized call can still run once the bucket is full."""
+        return min(amount, self.capacity)
+
+    def wait_for(self, amount):
+        """Return the seconds until one call costing ``amount`` units can take them."""
+        return self.time_for(self.cost(amount))
+
+    def time_for(self, amount):
+        """Return the seconds until ``amount`` units have accumulated, however many minutes that takes."""
+        if not self.capacity:
+            return 0.0
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        if self.capacity:
+            self.level -= self.cost(amount)
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "tokens", "granted", "wake")
+
+    def __init__(self, priority, seq, tokens, wake):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.granted = False
+        self.wake = wake
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets for one model, served by priority.
+
+    Waiting calls queue by (priority, arrival); only the head of the queue waits for the
+    buckets to refill, so a lower-priority call never takes budget a higher one is waiting for.
+    With ``fail_fast``, a call whose estimated queue time exceeds its deadline is rejected at once.
+    """
+
+    def __init__(self, model, rpm=0, tpm=0, fail_fast=True):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.fail_fast = fail_fast
+        self.lock = threading.Lock()
+        self.queue = []
+        self.seq = itertools.count()
+        self.rejected = 0
+
+    def acquire(self, tokens, priority, timeout=None):
+        """Wait on a thread for budget for one request of ``tokens`` tokens; return the queue time."""
+        event = threading.Event()
+        ticket = self._enqueue(tokens, priority, event.set)
+        start = time.monotonic()
+        while True:
+            wait = self._poll(ticket, start, timeout)
+            if wait is None:
+                return self._granted(ticket, start)
+            event.wait(wait)
+            event.clear()
+
+    async def acquire_async(self, tokens, priority, timeout=None):
+        """Wait on the event loop for budget for one request of ``tokens`` tokens; return the queue time."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        ticket = self._enqueue(tokens, priority, lambda: loop.call_soon_threadsafe(event.set))
+        start = time.monotonic()
+        try:
+            while True:
+                wait = self._poll(ticket, start, timeout)
+                if wait is None:
+                    return self._granted(ticket, start)
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except asyncio.CancelledError:
+            self._withdraw(ticket)
+            raise
+
+    def settle(self, reserved, used):
+        """Charge the difference between the tokens reserved for a call and those it actually used."""
+        with self.lock:
+            self.tokens.take(used - reserved)
+
+    def stats(self):
+        with self.lock:
+            waiting = {}
+            for ticket in self.queue:
+                name = Priority(ticket.priority).name.lower()
+                waiting[name] = waiting.get(name, 0) + 1
+            return {
+                "requests_available": self.requests.level if self.requests.capacity else None,
+                "tokens_available": self.tokens.level if self.tokens.capacity else None,
+                "waiting": waiting,
+                "rejected": self.rejected,
+            }
+
+    def _enqueue(self, tokens, priority, wake):
+        with self.lock:
+            ticket = _Ticket(int(priority), next(self.seq), tokens, wake)
+            heapq.heappush(self.queue, ticket)
+            return ticket
+
+    def _poll(self, ticket, start, timeout):
+        """Grant what the buckets allow; return None once ``ticket`` is granted, else how long to wait."""
+        with self.lock:
+            self._dispatch()
+            if ticket.granted:
+                return None
+            left = float("inf") if timeout is None else start + timeout - time.monotonic()
+            estimate = self._estimated_wait(ticket)
+            if left <= 0 or (self.fail_fast and estimate > left):
+                self._remove(ticket)
+                self.rejected += 1
+                metrics.incr(f"llm.{self.model}.rate_limited")
+                raise QueueTimeout(f"{self.model} rate limit queue would exceed the deadline")
+            if self.queue[0] is ticket:
+                return min(max(estimate, 0.001), left)
+            # Calls behind the head sleep until they reach it, rechecking now and then
+            return min(left, 60.0)
+
+    def _dispatch(self):
+        """Grant queued calls in priority order while the buckets allow, waking the new head."""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        granted = False
+        while self.queue:
+            head = self.queue[0]
+            if self.requests.wait_for(1) or self.tokens.wait_for(head.tokens):
+                break
+            heapq.heappop(self.queue)
+            self.requests.take(1)
+            self.tokens.take(head.tokens)
+            head.granted = True
+            head.wake()
+            granted = True
+        if granted and self.queue:
+            self.queue[0].wake()
+
+    def _estimated_wait(self, ticket):
+        """Estimate the seconds until the buckets cover ``ticket`` and every call queued ahead of it."""
+        ahead = [other for other in self.queue if not ticket < other]
+        return max(
+            self.requests.time_for(len(ahead)),
+            self.tokens.time_for(sum(self.tokens.cost(other.tokens) for other in ahead)),
+        )
+
+    def _granted(self, ticket, start):
+        waited = time.monotonic() - start
+        metrics.observe(f"llm.queue.{Priority(ticket.priority).name.lower()}", waited)
+        return waited
+
+    def _withdraw(self, ticket):
+        with self.lock:
+            if not ticket.granted:
+                self._remove(ticket)
+
+    def _remove(self, ticket):
+        self.queue.remove(ticket)
+        heapq.heapify(self.queue)
+        if self.queue:
+            self.queue[0].wake()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter(model):
+    """Return the rate limiter of ``model``, with LLM_RPM/LLM_TPM unless LLM_MODEL_RATE_LIMITS overrides them."""
+    with _limiters_lock:
+        if model not in _limiters:
+            limits = settings.LLM_MODEL_RATE_LIMITS.get(model, {})
+            _limiters[model] = RateLimiter(
+                model,
+                rpm=limits.get("rpm", settings.LLM_RPM),
+                tpm=limits.get("tpm", settings.LLM_TPM),
+                fail_fast=settings.LLM_RATE_FAIL_FAST,
+            )
+        return _limiters[model]
+
+
+def stats():
+    """Return the budget and queue state of every model used so far."""
+    with _limiters_lock:
+        return {model: limiter.stats() for model, limiter in _limiters.items()}
+
+
+metrics.register("rate_limiter", stats)
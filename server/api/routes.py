@@ -1,242 +1,35 @@
-from fastapi import APIRouter, HTTPException
-from api.utils import process_query, run_commands, get_llm_response
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from api.utils import process_query, run_commands, get_llm_response_async, stream_llm_response, gemini_embed_text
+from api.async_io import run_blocking
 from api.config import settings
-from api.models import UserQuery, CommandRequest, PineconeQuery, PineconeStoreRequest, RoutingDetails
-from api.pinecone_utils import pinecone_index
-import google.generativeai as genai_old
-from google.ai.generativelanguage_v1beta.types import content
+from api.models import UserQuery, CommandRequest, PineconeQuery, PineconeStoreRequest, RoutingDetails, IndexRebuildRequest, CodeCacheInvalidateRequest, CodeRunRequest
+from api.pinecone_utils import get_pinecone_index, upsert_vectors, sync_local_store
+from api.semantic_cache import command_cache
+from api.speculation import speculative_retrieval
+from api.sessions import session_store
+from api.intent import NO_INTENT, fast_path_reply, intent_classifier
+from api.code_cache import code_cache
+from api.file_index import rebuild_file_index
+from api.content_index import get_content_index
+from api.file_service import get_file_server
+from api import metrics, startup
+from api.ingest import ingest_records, parse_records
+from api.llm_gateway import deadline, generate_async, generate_stream
+from api.rate_limiter import Priority, priority
 
 import os
-import socket
-import threading
-import time
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-import difflib
-import json
-from google import genai
 import re
+import random
+import asyncio
+import functools
+import json
+import uuid
+from typing import Optional
 
 
 router = APIRouter()
 
-# Global file server instance
-file_server = None
-
-class FileServer:
-    def __init__(self, directory=None, port=8000, api_key=None):
-        """Initialize the file server with specified directory and port."""
-        self.directory = os.path.abspath(directory) if directory else os.getcwd()
-        self.port = port
-        self.server = None
-        self.server_thread = None
-        self.ip_address = self.get_local_ip()
-        self.api_key = api_key
-        
-        # Initialize Gemini client if API key is provided
-        if self.api_key:
-            try:
-                self.gemini_client = genai.Client(api_key=self.api_key)
-                self.gemini_enabled = True
-                print("Gemini AI search enabled")
-            except Exception as e:
-                print(f"Failed to initialize Gemini: {e}")
-                self.gemini_enabled = False
-        else:
-            self.gemini_enabled = False
-            
-    def get_local_ip(self):
-        """Get the local IP address of the machine."""
-        try:
-            # Create a socket to determine the local IP
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except Exception:
-            return "127.0.0.1"  # Fallback to localhost if unable to determine IP
-
-    def start_server(self):
-        """Start the HTTP server in a separate thread."""
-        os.chdir(self.directory)
-        
-        # Create and configure the HTTP server
-        handler = SimpleHTTPRequestHandler
-        self.server = HTTPServer(("0.0.0.0", self.port), handler)
-        
-        # Start the server in a separate thread
-        self.server_thread = threading.Thread(target=self.server.serve_forever)
-        self.server_thread.daemon = True
-        self.server_thread.start()
-        
-        # Wait for server to start
-        time.sleep(1)
-        print(f"Server started at http://{self.ip_address}:{self.port}")
-        return True
-        
-    def stop_server(self):
-        """Stop the HTTP server."""
-        if self.server:
-            self.server.shutdown()
-            self.server_thread.join()
-            print("Server stopped.")
-    
-    def interpret_query_with_gemini(self, natural_query):
-        """Use Gemini to interpret a natural language query into search parameters."""
-        if not self.gemini_enabled:
-            print("Gemini AI not enabled. Using direct search.")
-            return {"query": natural_query, "directory": self.directory}
-            
-        try:
-            prompt = f"""
-            Given this natural language request to find a file: "{natural_query}"
-            Extract the following information:
-            1. The file name or keywords to search for
-            2. Any specific directory mentioned (if none, return "default")
-            
-            Format your response as a JSON object with the following structure:
-            {{
-                "query": "search keywords",
-                "directory": "specific directory or 'default'"
-            }}
-            Only return the JSON, without any explanation.
-            """
-            
-            response = self.gemini_client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
-            )
-            
-            # Extract the JSON response
-            response_text = response.text
-            
-            # Try to clean and parse the JSON string
-            try:
-                # Remove any code block markers that might be in the response
-                json_str = re.sub(r'```json|```|\n', '', response_text).strip()
-                
-                # Use Python's eval to convert the string to a dictionary
-                # This is safer than using eval() directly on unknown input
-                import ast
-                result = ast.literal_eval(json_str)
-                
-                # If directory is 'default', use the current directory
-                if result.get('directory') == 'default':
-                    result['directory'] = self.directory
-                else:
-                    # Handle special cases like "desktop"
-                    directory = result.get('directory')
-                    if directory.lower() == 'desktop':
-                        # Get the user's desktop directory
-                        home = os.path.expanduser("~")
-                        desktop = os.path.join(home, 'Desktop')
-                        if os.path.exists(desktop):
-                            result['directory'] = desktop
-                    elif not os.path.isabs(directory):
-                        # If it's a relative path, make it absolute
-                        result['directory'] = os.path.abspath(directory)
-                        
-                return result
-            except:
-                # Fallback to basic parsing if JSON parsing fails
-                if "file name" in response_text.lower() and ":" in response_text:
-                    keywords = response_text.split(":")[-1].strip()
-                    return {"query": keywords, "directory": self.directory}
-                else:
-                    return {"query": natural_query, "directory": self.directory}
-                    
-        except Exception as e:
-            print(f"Error using Gemini API: {e}")
-            return {"query": natural_query, "directory": self.directory}
-    
-    def find_files(self, query, directory=None, max_results=5):
-        """Find files with names similar to the query."""
-        search_dir = directory if directory else self.directory
-        all_files = []
-        
-        # Walk through the directory and collect all files
-        for root, _, files in os.walk(search_dir):
-            for file in files:
-                # Calculate relative path for URL generation
-                rel_path = os.path.join(root, file)
-                all_files.append(rel_path)
-        
-        # Find the closest matches
-        if not all_files:
-            return []
-            
-        # Try fuzzy matching first
-        matches = difflib.get_close_matches(query, all_files, n=max_results, cutoff=0.1)
-        
-        # If no matches found with difflib, try a more lenient substring search
-        if not matches:
-            matches = [f for f in all_files if query.lower() in os.path.basename(f).lower()][:max_results]
-            
-            # If still no matches, try with partial keywords
-            if not matches:
-                keywords = query.lower().split()
-                matches = [f for f in all_files if any(keyword in os.path.basename(f).lower() for keyword in keywords)][:max_results]
-                
-        return matches
-    
-    def generate_download_links(self, files):
-        """Generate download links for the matched files."""
-        links = []
-        base_url = f"http://{self.ip_address}:{self.port}"
-        
-        for file_path in files:
-            # Get the relative path for URL generation
-            rel_path = os.path.relpath(file_path, self.directory)
-            
-            # URL encode the file path for proper URL formatting
-            url_path = "/".join([part.replace(" ", "%20") for part in rel_path.split(os.sep)])
-            link = f"{base_url}/{url_path}"
-            
-            # Get file metadata
-            file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
-            file_size_formatted = format_file_size(file_size)
-            
-            links.append({
-                "name": file_name,
-                "path": file_path,
-                "size": file_size_formatted,
-                "url": link
-            })
-            
-        return links
-
-def format_file_size(size_bytes):
-    """Format file size in bytes to human-readable format."""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.2f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.2f} PB"
-
-# Initialize the file server with environment variables
-def initialize_file_server(directory=None, port=8000, api_key=None):
-    global file_server
-    
-    # Use environment variables if available
-    directory = directory or os.environ.get("FILE_SERVER_DIR", os.getcwd())
-    port = port or int(os.environ.get("FILE_SERVER_PORT", 7056))
-    api_key = api_key or os.environ.get("GEMINI_API_KEY", None)
-    
-    file_server = FileServer(directory=directory, port=port, api_key=api_key)
-    file_server.start_server()
-    return file_server
-
-
-
-# Helper to decide if a query is related to file sharing
-def is_file_sharing_query(query: str) -> bool:
-    """Check if the query is related to file sharing."""
-    keywords = ["find file", "search file", "look for file", "share file", 
-                "find document", "search document", "download", "desktop file", 
-                "find", "search"]
-    return any(keyword in query.lower() for keyword in keywords)
-
 
 system_prompt = """
 
@@ -309,121 +102,324 @@ A JSON response structured as:
    ```
 """
 
-genai_old.configure(api_key=settings.GOOGLE_API_KEY)
+ROUTER_MODEL = "gemini-2.0-flash"
 
-# Create the model
+# Model behind get_llm_response, used to key the generated-code cache
+CODE_MODEL = "gemini-2.0-flash"
+
+# Create the model configuration. Kept as plain data so importing the routes does not load the SDK types.
 generation_config = {
   "temperature": 1,
   "top_p": 0.95,
   "top_k": 40,
   "max_output_tokens": 8192,
-  "response_schema": content.Schema(
-    type = content.Type.OBJECT,
-    enum = [],
-    required = ["Message", "Routing"],
-    properties = {
-      "Message": content.Schema(
-        type = content.Type.STRING,
-      ),
-      "Routing": content.Schema(
-        type = content.Type.OBJECT,
-        enum = [],
-        required = ["Action", "Details"],
-        properties = {
-          "Action": content.Schema(
-            type = content.Type.STRING,
-          ),
-          "Details": content.Schema(
-            type = content.Type.STRING,
-          ),
+  # Routing is generated before Message, so /router/stream/ can send the action before the text
+  "response_schema": {
+    "type": "OBJECT",
+    "required": ["Message", "Routing"],
+    "property_ordering": ["Routing", "Message"],
+    "properties": {
+      "Routing": {
+        "type": "OBJECT",
+        "required": ["Action", "Details"],
+        "property_ordering": ["Action", "Details"],
+        "properties": {
+          "Action": {
+            "type": "STRING",
+          },
+          "Details": {
+            "type": "STRING",
+          },
         },
-      ),
+      },
+      "Message": {
+        "type": "STRING",
+      },
     },
-  ),
+  },
   "response_mime_type": "application/json",
+  "system_instruction": system_prompt,
 }
 
-model = genai_old.GenerativeModel(
-  model_name="gemini-2.0-flash",
-  generation_config=generation_config,
-  system_instruction=system_prompt,
-)
-
-
-chat_session = model.start_chat()
+def router_config(summary: str = ""):
+    """Return the router configuration, with the summary of older turns added to its instructions."""
+    if not summary:
+        return generation_config
+    return dict(
+        generation_config,
+        system_instruction=system_prompt + "\n\n### **Summary of the earlier conversation:**\n" + summary,
+    )
+
+def router_contents(session, text: str):
+    """Return the session's recent turns followed by the new user message."""
+    return list(session.history) + [{"role": "user", "parts": [{"text": text}]}]
+
+def interactive(handler):
+    """Bound the LLM calls a user-facing route makes by REQUEST_DEADLINE; bulk routes run without one."""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        with deadline(settings.REQUEST_DEADLINE):
+            return await handler(*args, **kwargs)
+    return wrapper
+
+async def interactive_stream(events):
+    """Iterate a streamed response body under REQUEST_DEADLINE, counted from when it starts."""
+    with deadline(settings.REQUEST_DEADLINE):
+        async for event in events:
+            yield event
 
 
 @router.post("/router/")
-async def route_query(query: UserQuery):
+@interactive
+async def route_query(query: UserQuery, http_request: Request, http_response: Response):
     """Routes the user's query to the appropriate action."""
+    request_key, session_id, session = begin_routing(query, http_request)
+    http_response.headers["X-Request-Key"] = request_key
+    http_response.headers["X-Session-Id"] = session_id
+    intent = await classify_intent(query.query)
+    if intent.confident:
+        text = fast_path_reply(intent, query.query)
+    else:
+        try:
+            response = await generate_async(
+                ROUTER_MODEL, router_contents(session, query.query), router_config(session.summary), priority=Priority.INTERACTIVE,
+            )
+        except Exception:
+            speculative_retrieval.cancel(request_key)
+            raise
+        text = response.text
+        intent_classifier.compare(intent, routed_action(text))
+    session_store.append(session, query.query, text)
+    if routed_action(text) in ("Filesharing", "NULL/Other"):
+        speculative_retrieval.cancel(request_key)
+    return text
+
+@router.post("/router/stream/")
+@interactive
+async def route_query_stream(query: UserQuery, http_request: Request):
+    """Streams the router's reply as SSE, with an early "action" event as soon as Routing.Action is known."""
+    request_key, session_id, session = begin_routing(query, http_request)
+    headers = {"X-Request-Key": request_key, "X-Session-Id": session_id}
+    intent = await classify_intent(query.query)
+    return StreamingResponse(interactive_stream(stream_routing(query, request_key, session, intent)), media_type="text/event-stream", headers=headers)
+
+async def stream_routing(query: UserQuery, request_key: str, session, intent):
+    """Forward router tokens as they arrive, surfacing the action from the partial JSON."""
+    if intent.confident:
+        text = fast_path_reply(intent, query.query)
+        if intent.action in ("Filesharing", "NULL/Other"):
+            speculative_retrieval.cancel(request_key)
+        session_store.append(session, query.query, text)
+        yield format_event("action", {"Action": intent.action, "request_key": request_key}, sse=True)
+        yield format_event("done", {"response": text}, sse=True)
+        return
+    text = ""
+    action = None
+    try:
+        chunks = generate_stream(
+            ROUTER_MODEL, router_contents(session, query.query), router_config(session.summary), priority=Priority.INTERACTIVE,
+        )
+        async for chunk in chunks:
+            if not chunk.text:
+                continue
+            text += chunk.text
+            yield format_event("token", {"text": chunk.text}, sse=True)
+            if action is None:
+                action = partial_action(text)
+                if action is not None:
+                    if action in ("Filesharing", "NULL/Other"):
+                        speculative_retrieval.cancel(request_key)
+                    yield format_event("action", {"Action": action, "request_key": request_key}, sse=True)
+    except Exception as e:
+        speculative_retrieval.cancel(request_key)
+        yield format_event("error", {"detail": str(e)}, sse=True)
+        return
+    intent_classifier.compare(intent, routed_action(text))
+    session_store.append(session, query.query, text)
+    yield format_event("done", {"response": text}, sse=True)
+
+# The event loop only keeps weak references to tasks, so running audits are held here
+audit_tasks = set()
+
+async def classify_intent(query: str):
+    """Classify a query locally, auditing a sample of fast-path answers against the router LLM."""
+    if not settings.INTENT_FAST_PATH:
+        return NO_INTENT
+    with priority(Priority.INTERACTIVE):
+        intent = await intent_classifier.classify(query)
+    if intent.confident and random.random() < settings.INTENT_AUDIT_RATE:
+        task = asyncio.create_task(audit_intent(intent, query))
+        audit_tasks.add(task)
+        task.add_done_callback(audit_tasks.discard)
+    return intent
+
+async def audit_intent(intent, query: str):
+    """Ask the router LLM about a query the fast path answered and record whether they agree."""
+    try:
+        response = await generate_async(ROUTER_MODEL, [query], generation_config, priority=Priority.BULK)
+        intent_classifier.compare(intent, routed_action(response.text))
+    except Exception as e:
+        print(f"Error auditing intent: {e}")
+
+def begin_routing(query: UserQuery, http_request: Request):
+    """Resolve the request key and session of a router call and start speculative retrieval."""
     print(query.query)
-    response = chat_session.send_message(query.query)
-    return response.text
+    request_key = http_request.headers.get("X-Request-Key") or uuid.uuid4().hex
+    # Each client continues its own bounded conversation instead of one shared global chat
+    session_id = query.session_id or http_request.headers.get("X-Session-Id") or uuid.uuid4().hex
+    session = session_store.get(session_id)
+    if settings.SPECULATIVE_RETRIEVAL:
+        # Embed and retrieve while the router decides, in case the route needs them
+        speculative_retrieval.start(request_key, query.query)
+    return request_key, session_id, session
+
+def routed_action(text: str) -> Optional[str]:
+    """Return Routing.Action from a router reply, or None if it cannot be parsed."""
+    try:
+        return json.loads(text)["Routing"]["Action"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+# Matches a complete "Action" string value, so it can be read before the rest of the JSON arrives
+ACTION_PATTERN = re.compile(r'"Action"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+def partial_action(text: str) -> Optional[str]:
+    """Return Routing.Action from a possibly incomplete router reply, or None if it is not complete yet."""
+    match = ACTION_PATTERN.search(text)
+    if not match:
+        return None
+    return json.loads(f'"{match.group(1)}"')
 
 @router.post("/execute/")
+@interactive
 async def execute_command(request: CommandRequest):
     """Executes a command if valid, otherwise stores it."""
     print(f"Executing command: {request.command}")
     
     if request.command == "Filesharing":
-        initialize_file_server()
+        if request.request_key:
+            speculative_retrieval.cancel(request.request_key)
+        # Reuse the long-lived file server, started on the first file sharing request
+        file_server = await run_blocking("files", get_file_server)
         # Process file sharing request
-        query = request.details.get("query", "")
-        
-        # Use the file server to search for files
-        if not file_server:
-            return {"status": "error", "message": "File server not initialized"}
-        
-        # Interpret the query with Gemini if available
-        search_params = file_server.interpret_query_with_gemini(query)
-        search_directory = search_params.get("directory")
-        search_query = search_params.get("query")
-        
-        # Find matching files
-        matching_files = file_server.find_files(search_query, directory=search_directory)
-        
-        if matching_files:
-            # Generate download links
-            links = file_server.generate_download_links(matching_files)
-            
-            # Create a response with file information and links
-            result = {
-                "status": "success",
-                "message": f"Found {len(links)} files matching '{search_query}'",
-                "directory": search_directory,
-                "search_query": search_query,
-                "files": links
-            }
-        else:
-            result = {
-                "status": "not_found",
-                "message": f"No files matching '{search_query}' were found",
-                "directory": search_directory,
-                "search_query": search_query,
-                "files": []
-            }
+        query = details_query(request.details)
         
-        return result
+        # Collect the streamed search events into a single response, off the event loop
+        return await run_blocking("files", collect_shared_files, file_server, query)
     else:
         # Your existing code for other commands
         if request.command != "NULL/Other":
-            prompt = process_query(request.command)
-            response = get_llm_response(
-                prompt,
-                """Your solo task is to choose a command...""",
-            )
+            text = request_text(request)
+            # Reuse the retrieval /router/ started for this request, if it is still around and
+            # was done for the same text, so the result never depends on whether it survived
+            speculated = await speculative_retrieval.take(request.request_key) if request.request_key else None
+            if speculated and speculated[0] == (text or request.command):
+                _, query_embedding, prompt = speculated
+            else:
+                query_embedding = await run_blocking("embedding", gemini_embed_text, text or request.command)
+                prompt = None
+            # Near-identical requests reuse the earlier command without retrieval or the LLM.
+            # A bare action label says nothing about the request, so it is never cached.
+            response = command_cache.lookup(query_embedding) if text else None
+            if response is None:
+                if prompt is None:
+                    prompt = await run_blocking("pinecone", process_query, text or request.command, query_embedding=query_embedding)
+                response = await get_llm_response_async(
+                    prompt,
+                    """Your solo task is to choose a command...""",
+                )
+                if text:
+                    command_cache.store(text, query_embedding, response)
             if "python" in response:
-                run_commands(response)
+                await run_commands(response)
                 return {"status": "success", "message": "Command executed"}
+        elif request.request_key:
+            speculative_retrieval.cancel(request.request_key)
     
     return {"status": "success", "message": "Command processed"}
 
+def request_text(request: CommandRequest) -> Optional[str]:
+    """Return the user's request text behind an /execute/ call, or None if the client sent only the action."""
+    return request.query or details_query(request.details) or None
+
+def details_query(details: Optional[str]) -> str:
+    """Return the search query from request details, sent as plain text or as {"query": ...} JSON."""
+    if not details:
+        return ""
+    try:
+        parsed = json.loads(details)
+    except ValueError:
+        return details
+    if isinstance(parsed, dict):
+        return parsed.get("query", "")
+    return details
+
+def collect_shared_files(file_server, query: str):
+    """Run a file sharing search to completion and return its summary with every file found."""
+    files = []
+    result = {}
+    for event, data in file_server.share_files(query):
+        if event == "file":
+            files.append(data)
+        elif event == "summary":
+            result = dict(data, files=files)
+    return result
+
+@router.post("/execute/stream/")
+async def execute_command_stream(request: CommandRequest, http_request: Request):
+    """Streams Filesharing results as NDJSON, or as SSE when the client accepts text/event-stream."""
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
+    if request.command == "Filesharing":
+        file_server = await run_blocking("files", get_file_server)
+        query = details_query(request.details)
+        # A sync generator is iterated on the threadpool, so slow searches do not block the event loop
+        events = file_server.share_files(query)
+    else:
+        result = await execute_command(request)
+        events = iter([("summary", result)])
+    
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse((format_event(event, data, sse) for event, data in events), media_type=media_type)
+
+def format_event(event, data, sse=False):
+    """Serialize one streamed event as an SSE frame or an NDJSON line."""
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+@router.post("/filesharing/index/rebuild/")
+async def rebuild_index(request: IndexRebuildRequest):
+    """Rebuild the filename index for a served directory from scratch."""
+    file_server = await run_blocking("files", get_file_server)
+    directory = os.path.abspath(request.directory or file_server.directory)
+    # Only directories the file server shares are ever indexed
+    if file_server.root_of(directory) is None:
+        raise HTTPException(status_code=403, detail=f"Not a served directory: {directory}")
+    if not os.path.isdir(directory):
+        raise HTTPException(status_code=404, detail=f"Directory not found: {directory}")
+    if settings.CONTENT_INDEX_ENABLED:
+        # Content extraction is slow, so it is only queued here
+        get_content_index(directory).schedule_update(force=True)
+    return await run_blocking("files", rebuild_file_index, directory)
+
+@router.get("/stats/")
+async def stats():
+    """Report cache hit rates and other runtime counters."""
+    return metrics.snapshot()
+
+@router.get("/startup/")
+async def startup_report():
+    """Report per-module import times, backend initialization times and warm-up results."""
+    return startup.report()
+
 @router.post("/pinecone/search/")
 async def pinecone_search(request: PineconeQuery):
     """Search in Pinecone index using the provided vector."""
     try:
-        results = pinecone_index.query(
-            vector=request.vector, top_k=request.top_k, include_metadata=True
+        index = await run_blocking("pinecone", get_pinecone_index)
+        results = await run_blocking(
+            "pinecone", index.query, vector=request.vector, top_k=request.top_k, include_metadata=True
         )
         return results
     except Exception as e:
@@ -433,7 +429,7 @@ async def pinecone_search(request: PineconeQuery):
 async def pinecone_store(request: PineconeStoreRequest):
     """Store a vector in Pinecone."""
     try:
-        pinecone_index.upsert(vectors=[{
+        await run_blocking("pinecone", upsert_vectors, [{
             "id": request.id,
             "values": request.vector,
             "metadata": request.metadata
@@ -442,12 +438,68 @@ async def pinecone_store(request: PineconeStoreRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/pinecone/ingest/")
+async def pinecone_ingest(http_request: Request, job_id: str, namespace: Optional[str] = None):
+    """Bulk-load NDJSON {id, text, metadata} records, streaming progress as NDJSON.
+    
+    Re-sending the same body with the same job_id resumes after the last upserted chunk.
+    """
+    body = await http_request.body()
+    records, failures = parse_records(body.decode("utf-8").splitlines())
+    events = ingest_records(records, job_id, namespace=namespace, failures=failures)
+    return StreamingResponse((format_event(event, data) for event, data in events), media_type="application/x-ndjson")
+
+@router.post("/vector-store/sync/")
+async def vector_store_sync():
+    """Pull the task-commands namespace from Pinecone into the local vector store."""
+    try:
+        return await run_blocking("pinecone", sync_local_store)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/generate-code/")
+@interactive
 async def generate_code(query: UserQuery):
-    """Generate Python code for the given query using LLM."""
+    """Generate Python code for the given query using LLM, reusing code generated for the same prompt."""
     try:
-        response = get_llm_response(query.query)
-        return {"code": response}
+        entry = await run_blocking("embedding", code_cache.get, query.query, CODE_MODEL)
+        cached = entry is not None
+        if not cached:
+            response = await get_llm_response_async(query.query, priority=Priority.CODEGEN)
+            entry = code_cache.put(query.query, CODE_MODEL, response)
+        return {"code": entry["code"], "syntax_ok": entry["syntax_ok"], "cached": cached}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate-code/stream/")
+async def generate_code_stream(query: UserQuery):
+    """Stream generated Python code as SSE "token" events, followed by a "done" event with the whole code."""
+    async def events():
+        entry = await run_blocking("embedding", code_cache.get, query.query, CODE_MODEL)
+        if entry is not None:
+            yield format_event("token", {"text": entry["code"]}, sse=True)
+            yield format_event("done", {"code": entry["code"], "syntax_ok": entry["syntax_ok"], "cached": True}, sse=True)
+            return
+        code = ""
+        try:
+            async for text in stream_llm_response(query.query, priority=Priority.CODEGEN):
+                code += text
+                yield format_event("token", {"text": text}, sse=True)
+        except Exception as e:
+            yield format_event("error", {"detail": str(e)}, sse=True)
+            return
+        entry = code_cache.put(query.query, CODE_MODEL, code)
+        yield format_event("done", {"code": entry["code"], "syntax_ok": entry["syntax_ok"], "cached": False}, sse=True)
+    return StreamingResponse(interactive_stream(events()), media_type="text/event-stream")
+
+@router.post("/generate-code/success/")
+async def record_code_success(request: CodeRunRequest):
+    """Record that the code generated for a prompt ran successfully, making it reusable for paraphrases."""
+    await run_blocking("embedding", code_cache.mark_success, request.query, request.model or CODE_MODEL)
+    return {"message": "Code run recorded"}
+
+@router.post("/generate-code/cache/invalidate/")
+async def invalidate_code_cache(request: CodeCacheInvalidateRequest):
+    """Drop the cached code for one prompt, or all cached code when no query is given."""
+    code_cache.invalidate(request.query, request.model or CODE_MODEL)
+    return {"message": "Code cache invalidated"}
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import numpy as np
+
+from api import metrics
+from api.config import settings
+
+
+class SemanticCache:
+    """Maps query embeddings to the command previously chosen for them.
+
+    A lookup hits when the closest stored query is at least ``threshold`` cosine-similar
+    and younger than ``ttl`` seconds. Entries are dropped wholesale by ``invalidate`` when
+    the command corpus changes, since a new example can change the best command.
+    """
+
+    def __init__(self, name, threshold=0.95, ttl=3600, maxsize=1024):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = []
+        self.matrix = None
+        self.hits = 0
+        self.misses = 0
+        metrics.register(f"cache.{name}", self.stats)
+
+    def lookup(self, vector):
+        """Return the cached command for the most similar stored query, or None."""
+        if vector is None:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self.lock:
+            self._expire()
+            if self.entries:
+                scores = self.matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = self.entries[best]
+                    entry["hits"] += 1
+                    self.hits += 1
+                    return entry["command"]
+            self.misses += 1
+            return None
+
+    def store(self, query_text, vector, command, created=None):
+        """Remember the command chosen for a query embedding, ``created`` now unless restored from disk."""
+        if vector is None or not command:
+            return
+        row = np.asarray(vector, dtype=np.float32)
+        row /= np.linalg.norm(row) or 1.0
+        with self.lock:
+            self.entries.append({"query": query_text, "vector": row, "command": command, "created": created or time.time(), "hits": 0})
+            # Evict the least used entries first, oldest among equals
+            if len(self.entries) > self.maxsize:
+                self.entries.sort(key=lambda entry: (entry["hits"], entry["created"]), reverse=True)
+                del self.entries[self.maxsize:]
+            self._rebuild()
+
+    def discard(self, command):
+        """Forget the entries that map to ``command``."""
+        with self.lock:
+            self.entries = [entry for entry in self.entries if entry["command"] != command]
+            self._rebuild()
+
+    def invalidate(self):
+        """Forget every entry."""
+        with self.lock:
+            self.entries = []
+            self._rebuild()
+
+    def stats(self):
+        """Return hit/miss counters and the most reused entries."""
+        with self.lock:
+            top = sorted(self.entries, key=lambda entry: entry["hits"], reverse=True)[:10]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self.entries),
+                "top_entries": [{"query": entry["query"], "hits": entry["hits"]} for entry in top],
+            }
+
+    def _expire(self):
+        if not self.ttl:
+            return
+        cutoff = time.time() - self.ttl
+        if any(entry["created"] < cutoff for entry in self.entries):
+            self.entries = [entry for entry in self.entries if entry["created"] >= cutoff]
+            self._rebuild()
+
+    def _rebuild(self):
+        self.matrix = np.vstack([entry["vector"] for entry in self.entries]) if self.entries else None
+
+
+# Commands chosen by the /execute/ pipeline for near-identical requests
+command_cache = SemanticCache(
+    "semantic_commands",
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl=settings.SEMANTIC_CACHE_TTL,
+    maxsize=settings.SEMANTIC_CACHE_SIZE,
+)
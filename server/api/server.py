@@ -1,13 +1,50 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
+from api import startup
 from api.config import settings
+
+# Imported one at a time, dependencies first, so the startup report shows what each module costs
+STARTUP_MODULES = [
+    "api.metrics", "api.cache", "api.async_io", "api.rate_limiter", "api.singleflight", "api.llm_gateway",
+    "api.embedding_cache", "api.vector_store", "api.semantic_cache", "api.context_builder", "api.pinecone_utils",
+    "api.utils", "api.speculation", "api.sessions", "api.intent", "api.code_cache",
+    "api.crawler", "api.file_search", "api.hash_cache", "api.file_index", "api.content_index",
+    "api.download_server", "api.file_service", "api.ingest", "api.models", "api.routes",
+]
+for module in STARTUP_MODULES:
+    startup.import_module(module)
+
 from api.routes import router
+from api.file_service import shutdown_file_server
+from api.code_cache import code_cache
+from api.intent import intent_classifier
+from api.llm_gateway import get_client
+from api.pinecone_utils import get_pinecone_index, get_vector_store
 
 load_dotenv()
 
-app = FastAPI()
+# Backends created ahead of the first request when WARM_UP is on
+WARM_UP_STEPS = [
+    ("genai", get_client),
+    ("pinecone", get_pinecone_index),
+    ("vector_store", get_vector_store),
+    ("intent", intent_classifier.warm_up),
+    ("code_cache", code_cache.load_semantic),
+]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.mark_ready()
+    if settings.WARM_UP:
+        startup.warm_up(WARM_UP_STEPS)
+    yield
+    # Stop the shared file server together with the app
+    shutdown_file_server()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS Middleware
 app.add_middleware(
@@ -16,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Key", "X-Session-Id"],
 )
 
 # Include modularized routes
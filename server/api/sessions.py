@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from api import metrics
+from api.config import settings
+from api.rate_limiter import Priority
+from api.utils import get_llm_response_async
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant that routes
+their requests. Merge the existing summary with the new turns into one short paragraph that keeps the
+facts, folders, files and preferences the user mentioned. Reply with the summary only."""
+
+
+class Session:
+    """Recent turns of one client's router conversation, plus a summary of older ones."""
+
+    def __init__(self):
+        self.history = []
+        self.pending = []
+        self.summary = ""
+        self.summarizing = False
+        self.last_used = time.monotonic()
+
+    def size(self):
+        """Approximate memory use as the number of characters held."""
+        return len(self.summary) + sum(len(part["text"]) for turn in self.history + self.pending for part in turn["parts"])
+
+
+class SessionStore:
+    """Per-session router history with a turn window, background summarization and eviction.
+
+    Sessions idle for ``idle_seconds`` are dropped, and the least recently used ones are
+    evicted once there are more than ``max_sessions`` or they hold over ``max_chars`` characters.
+    """
+
+    def __init__(self, window=10, idle_seconds=1800, max_sessions=1000, max_chars=5_000_000):
+        self.window = window
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+        # The event loop only keeps weak references to tasks, so running summaries are held here
+        self.tasks = set()
+        metrics.register("sessions", self.stats)
+
+    def get(self, session_id):
+        """Return the session for ``session_id``, creating it if it is new or was evicted."""
+        with self.lock:
+            self._evict_idle()
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session()
+            self.sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            return session
+
+    def append(self, session, user_text, model_text):
+        """Record one exchange, folding turns that fall out of the window into the summary."""
+        with self.lock:
+            session.history.append({"role": "user", "parts": [{"text": user_text}]})
+            session.history.append({"role": "model", "parts": [{"text": model_text}]})
+            overflow = len(session.history) - self.window * 2
+            if overflow > 0:
+                session.pending.extend(session.history[:overflow])
+                del session.history[:overflow]
+            self._evict_oversize()
+        if session.pending and not session.summarizing:
+            session.summarizing = True
+            task = asyncio.create_task(self._summarize(session))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def stats(self):
+        """Return the number of live sessions, their total size and the evictions so far."""
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "chars": sum(session.size() for session in self.sessions.values()),
+                "evicted": self.evicted,
+            }
+
+    async def _summarize(self, session):
+        try:
+            while session.pending:
+                turns, session.pending = session.pending, []
+                transcript = "\n".join(f"{turn['role']}: {turn['parts'][0]['text']}" for turn in turns)
+                message = f"EXISTING SUMMARY:\n{session.summary or '(none)'}\n\nNEW TURNS:\n{transcript}"
+                summary = await get_llm_response_async(message, SUMMARY_PROMPT, priority=Priority.BULK)
+                session.summary = summary.strip()[:settings.SESSION_SUMMARY_MAX_CHARS]
+                metrics.incr("sessions.summarized")
+        except Exception as e:
+            # The turns are lost from the prompt, which only costs some context
+            print(f"Error summarizing session: {e}")
+            session.pending = []
+        finally:
+            session.summarizing = False
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self.sessions[session_id]
+            self.evicted += 1
+
+    def _evict_oversize(self):
+        total = sum(session.size() for session in self.sessions.values())
+        while len(self.sessions) > 1 and (len(self.sessions) > self.max_sessions or total > self.max_chars):
+            _, session = self.sessions.popitem(last=False)
+            total -= session.size()
+            self.evicted += 1
+
+
+session_store = SessionStore(
+    window=settings.SESSION_HISTORY_WINDOW,
+    idle_seconds=settings.SESSION_IDLE_SECONDS,
+    max_sessions=settings.SESSION_MAX_SESSIONS,
+    max_chars=settings.SESSION_MAX_CHARS,
+)
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import json
+import threading
+
+from api import metrics
+
+
+def call_key(*parts):
+    """Hash call arguments such as (model, contents, config) into a coalescing key."""
+    encoded = json.dumps(parts, sort_keys=True, default=_encode)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _encode(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    return repr(value)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls: duplicates wait for the first one and share its outcome.
+
+    Only calls in flight at the same time are merged; nothing is cached once a call returns.
+    """
+
+    def __init__(self, name):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.tasks = {}
+        self.started = 0
+        self.coalesced = 0
+        metrics.register(f"singleflight.{name}", self.stats)
+
+    def do(self, key, fn):
+        """Run ``fn()`` on a thread, or wait for the identical call already running."""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.started += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+
+    async def do_async(self, key, fn):
+        """Await ``fn()``, or the identical call already running on this event loop."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            task = self.tasks.get((loop, key))
+            if task is None:
+                task = self.tasks[(loop, key)] = loop.create_task(fn())
+                task.add_done_callback(lambda _: self._forget(loop, key))
+                self.started += 1
+            else:
+                self.coalesced += 1
+        # Shielded, so one caller giving up does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """Return how many calls were started and how many joined one already in flight."""
+        with self.lock:
+            return {
+                "started": self.started,
+                "coalesced": self.coalesced,
+                "in_flight": len(self.calls) + len(self.tasks),
+            }
+
+    def _forget(self, loop, key):
+        with self.lock:
+            self.tasks.pop((loop, key), None)
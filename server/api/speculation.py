@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from api import metrics
+from api.async_io import run_blocking
+from api.config import settings
+from api.utils import gemini_embed_text, process_query
+
+
+class SpeculativeRetrieval:
+    """Embedding and retrieval for a query, started while /router/ is still classifying it.
+
+    Results are kept under the request key /router/ hands out, for ``ttl`` seconds, so the
+    following /execute/ call can reuse them instead of starting from scratch.
+    """
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self.pending = {}
+
+    def start(self, key, query):
+        """Start retrieval for ``query`` in the background under ``key``."""
+        self._expire()
+        self.cancel(key)
+        self.pending[key] = (asyncio.create_task(self._retrieve(query)), time.monotonic())
+        metrics.incr("speculation.started")
+
+    async def take(self, key):
+        """Return the (query, query_embedding, prompt) computed under ``key``, or None if there is none."""
+        self._expire()
+        item = self.pending.pop(key, None)
+        if item is None:
+            metrics.incr("speculation.missed")
+            return None
+        try:
+            result = await item[0]
+        except Exception as e:
+            print(f"Speculative retrieval failed: {e}")
+            return None
+        metrics.incr("speculation.used")
+        return result
+
+    def cancel(self, key):
+        """Drop the work started under ``key``, if any."""
+        item = self.pending.pop(key, None)
+        if item is not None:
+            # A call already running on the executor finishes, but its result is discarded
+            item[0].cancel()
+            metrics.incr("speculation.cancelled")
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for key in [key for key, (_, created) in self.pending.items() if created < cutoff]:
+            self.pending.pop(key)[0].cancel()
+            metrics.incr("speculation.expired")
+
+    async def _retrieve(self, query):
+        query_embedding = await run_blocking("embedding", gemini_embed_text, query)
+        prompt = await run_blocking("pinecone", process_query, query, query_embedding=query_embedding)
+        return query, query_embedding, prompt
+
+
+speculative_retrieval = SpeculativeRetrieval(ttl=settings.SPECULATION_TTL)
@@ -0,0 +1,77 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+from api import metrics
+
+_started = time.perf_counter()
+_imports = {}
+_inits = {}
+_warm_up = {}
+_ready = {"seconds": None}
+_lock = threading.Lock()
+
+
+def import_module(name):
+    """Import a module and record how long it took.
+
+    Modules already imported are not counted again, so importing dependencies first
+    makes each timing the cost of that module itself.
+    """
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    _imports[name] = time.perf_counter() - start
+    return module
+
+
+@contextmanager
+def timed(name):
+    """Record how long the lazy initialization of one backend client took."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _inits[name] = time.perf_counter() - start
+
+
+def mark_ready():
+    """Record the time from the first server import until the app can serve requests."""
+    _ready["seconds"] = time.perf_counter() - _started
+
+
+def warm_up(steps):
+    """Run ``(name, fn)`` initialization steps in order on a background thread.
+
+    A failing step is reported and skipped; the backend it warms up is then
+    initialized on first use instead.
+    """
+    def run():
+        for name, fn in steps:
+            start = time.perf_counter()
+            try:
+                fn()
+                state = "ok"
+            except Exception as e:
+                print(f"Warm-up of {name} failed: {e}")
+                state = f"error: {e}"
+            with _lock:
+                _warm_up[name] = {"state": state, "seconds": time.perf_counter() - start}
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def report():
+    """Return per-module import times, per-backend initialization times and warm-up results."""
+    with _lock:
+        return {
+            "ready_seconds": _ready["seconds"],
+            "imports": dict(sorted(_imports.items(), key=lambda item: -item[1])),
+            "import_total_seconds": sum(_imports.values()),
+            "initialization": dict(_inits),
+            "warm_up": dict(_warm_up),
+        }
+
+
+metrics.register("startup", report)
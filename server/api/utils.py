@@ -1,58 +1,109 @@
+import asyncio
 import os
-import subprocess
 from api.config import settings
-from google import genai
+from api.async_io import limit
+from api.llm_gateway import embed, generate, generate_async, generate_stream
+from api.rate_limiter import Priority
 from time import sleep
-from api.pinecone_utils import pinecone_index
-from google.genai import types
+from api.pinecone_utils import get_vector_store
+from api.embedding_cache import cached_embedding, cached_embeddings
+from api.context_builder import build_context, estimate_tokens
+from api import metrics
 
-client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+EMBEDDING_MODEL = "models/text-embedding-004"
 
-def run_commands(command: str):
-    """Executes system commands securely."""
-    try:
-        if command.startswith("python"):
-            subprocess.run(command.split(), check=True)
-        else:
-            print("Unknown command")
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {e}")
+async def run_commands(command: str):
+    """Executes system commands securely, without blocking the event loop."""
+    if not command.startswith("python"):
+        print("Unknown command")
+        return
+    async with limit("subprocess"):
+        try:
+            process = await asyncio.create_subprocess_exec(*command.split())
+            returncode = await process.wait()
+        except OSError as e:
+            print(f"Error executing command: {e}")
+            return
+    if returncode:
+        print(f"Error executing command: {command!r} exited with status {returncode}")
 
 def gemini_embed_text(text: str):
-    """Generates an embedding using Gemini API."""
+    """Generates an embedding using Gemini API, served from the embedding cache when possible."""
+    return cached_embedding(EMBEDDING_MODEL, text, _embed_uncached)
+
+def _embed_uncached(text: str):
     try:
-        result = client.models.embed_content(model="models/text-embedding-004", contents=text)
+        result = embed(EMBEDDING_MODEL, text)
         return result.embeddings[0].values
 
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return None
 
-def process_query(query: str):
+def gemini_embed_batch(texts: list):
+    """Generates embeddings for many texts with list inputs, reusing cached ones."""
+    return cached_embeddings(EMBEDDING_MODEL, texts, _embed_batch_uncached)
+
+def _embed_batch_uncached(texts: list):
+    vectors = []
+    for start in range(0, len(texts), settings.EMBED_BATCH_SIZE):
+        batch = texts[start:start + settings.EMBED_BATCH_SIZE]
+        try:
+            result = embed(EMBEDDING_MODEL, batch)
+            vectors.extend(embedding.values for embedding in result.embeddings)
+        except Exception as e:
+            print(f"Error generating batch embedding: {e}")
+            vectors.extend([None] * len(batch))
+    return vectors
+
+def process_query(query: str, query_embedding: list = None):
     """Processes user query, generates embeddings, and searches Pinecone."""
     if not query:
         return None
 
-    query_embedding = gemini_embed_text(query)
-    results = pinecone_index.query(
-        vector=query_embedding, 
+    if query_embedding is None:
+        query_embedding = gemini_embed_text(query)
+    results = get_vector_store().query(
+        query_embedding, 
         top_k=5, 
         namespace=settings.PINECONE_NAMESPACE, 
         include_metadata=True
     )
 
-    contexts = [item['metadata']['example'] for item in results.to_dict().get('matches', [])]
+    context = build_context(results.get('matches', []))
 
-    message = "<CONTEXT>\n" + "\n\n-------\n\n".join(contexts[:10]) + "\n-------\n</CONTEXT>\n\n\n\nMY QUESTION:\n" + query
+    message = "<CONTEXT>\n" + context + "\n-------\n</CONTEXT>\n\n\n\nMY QUESTION:\n" + query
+    metrics.record("prompt.tokens", estimate_tokens(message))
     return message
 
-def get_llm_response(msg: str, system_prompt: str = None):
+def get_llm_response(msg: str, system_prompt: str = None, priority: Priority = None):
     """Gets a response from Gemini LLM."""
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        config=types.GenerateContentConfig(
-            system_instruction=system_prompt),
-        contents=[msg]
+    response = generate(
+        "gemini-2.0-flash",
+        [msg],
+        {"system_instruction": system_prompt},
+        priority=priority,
     )
     return response.text
 
+async def get_llm_response_async(msg: str, system_prompt: str = None, priority: Priority = None):
+    """Gets a response from Gemini LLM without blocking the event loop."""
+    response = await generate_async(
+        "gemini-2.0-flash",
+        [msg],
+        {"system_instruction": system_prompt},
+        priority=priority,
+    )
+    return response.text
+
+async def stream_llm_response(msg: str, system_prompt: str = None, priority: Priority = None):
+    """Yields the text of a Gemini response chunk by chunk as it is generated."""
+    chunks = generate_stream(
+        "gemini-2.0-flash",
+        [msg],
+        {"system_instruction": system_prompt},
+        priority=priority,
+    )
+    async for chunk in chunks:
+        if chunk.text:
+            yield chunk.text
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from api.config import settings
+
+# HNSW is optional; without hnswlib the local store always does exact search
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+FETCH_BATCH_SIZE = 100
+
+
+class VectorStore:
+    """Interface shared by the Pinecone-backed and local vector stores.
+
+    ``query`` returns a dict shaped like Pinecone's ``QueryResponse.to_dict()``:
+    ``{"matches": [{"id": ..., "score": ..., "metadata": {...}}, ...]}``.
+    """
+
+    def query(self, vector, top_k=5, namespace=None, include_metadata=True):
+        raise NotImplementedError
+
+    def upsert(self, vectors, namespace=None):
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """Vector store backed by a remote Pinecone index."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def query(self, vector, top_k=5, namespace=None, include_metadata=True):
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            namespace=namespace or settings.PINECONE_NAMESPACE,
+            include_metadata=include_metadata,
+        )
+        return results.to_dict()
+
+    def upsert(self, vectors, namespace=None):
+        self.index.upsert(vectors=vectors, namespace=namespace or settings.PINECONE_NAMESPACE)
+
+
+class LocalVectorStore(VectorStore):
+    """In-process store for one namespace: a memory-mapped float32 matrix searched by cosine similarity.
+
+    Rows are stored L2-normalized, so cosine similarity is a single matrix-vector product.
+    Above HNSW_THRESHOLD rows, and when hnswlib is installed, queries go through an HNSW graph.
+    """
+
+    def __init__(self, namespace, directory=None):
+        self.namespace = namespace
+        directory = directory or os.path.join(settings.CACHE_DIR, "vectors")
+        os.makedirs(directory, exist_ok=True)
+        self.matrix_path = os.path.join(directory, f"{namespace}.f32")
+        self.meta_path = os.path.join(directory, f"{namespace}.json")
+        self.lock = threading.RLock()
+        self.ids = []
+        self.metadata = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.graph = None
+        self.load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self):
+        """Map the persisted matrix and metadata, if any."""
+        with self.lock:
+            if not os.path.exists(self.meta_path):
+                return
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.ids = meta["ids"]
+            self.metadata = meta["metadata"]
+            if self.ids:
+                shape = (len(self.ids), meta["dim"])
+                self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=shape)
+            self.graph = None
+
+    def query(self, vector, top_k=5, namespace=None, include_metadata=True):
+        with self.lock:
+            if not self.ids:
+                return {"matches": []}
+            query = np.asarray(vector, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+            top_k = min(top_k, len(self.ids))
+
+            if hnswlib is not None and len(self.ids) >= settings.HNSW_THRESHOLD:
+                labels, distances = self._hnsw().knn_query(query, k=top_k)
+                ranked = zip(labels[0], 1.0 - distances[0])
+            else:
+                scores = self.matrix @ query
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                best = best[np.argsort(-scores[best])]
+                ranked = zip(best, scores[best])
+
+            matches = []
+            for row, score in ranked:
+                match = {"id": self.ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = self.metadata[row]
+                matches.append(match)
+            return {"matches": matches}
+
+    def upsert(self, vectors, namespace=None):
+        """Insert or replace vectors given as Pinecone-style {id, values, metadata} dicts."""
+        with self.lock:
+            ids = list(self.ids)
+            metadata = list(self.metadata)
+            rows = [np.asarray(row) for row in self.matrix]
+            positions = {vector_id: i for i, vector_id in enumerate(ids)}
+            for vector in vectors:
+                row = np.asarray(vector["values"], dtype=np.float32)
+                row /= np.linalg.norm(row) or 1.0
+                if vector["id"] in positions:
+                    i = positions[vector["id"]]
+                    rows[i] = row
+                    metadata[i] = vector.get("metadata") or {}
+                else:
+                    positions[vector["id"]] = len(ids)
+                    ids.append(vector["id"])
+                    rows.append(row)
+                    metadata.append(vector.get("metadata") or {})
+            self._write(ids, metadata, np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32))
+
+    def sync_from(self, index):
+        """Replace the local copy with every vector of this namespace in a Pinecone index."""
+        ids = [vector_id for page in index.list(namespace=self.namespace) for vector_id in page]
+        rows = []
+        metadata = []
+        kept_ids = []
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            fetched = index.fetch(ids=ids[start:start + FETCH_BATCH_SIZE], namespace=self.namespace).vectors
+            for vector_id, vector in fetched.items():
+                row = np.asarray(vector.values, dtype=np.float32)
+                rows.append(row / (np.linalg.norm(row) or 1.0))
+                metadata.append(dict(vector.metadata or {}))
+                kept_ids.append(vector_id)
+        with self.lock:
+            self._write(kept_ids, metadata, np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32))
+        return len(kept_ids)
+
+    def _write(self, ids, metadata, matrix):
+        """Persist the matrix and metadata atomically and remap them."""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        matrix.tofile(self.matrix_path + ".tmp")
+        with open(self.meta_path + ".tmp", "w") as f:
+            json.dump({"ids": ids, "metadata": metadata, "dim": int(matrix.shape[1]) if ids else 0}, f)
+        # Drop the old mapping before replacing the file underneath it
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        os.replace(self.matrix_path + ".tmp", self.matrix_path)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+        self.load()
+
+    def _hnsw(self):
+        """Build the HNSW graph over the current matrix on first use."""
+        if self.graph is None:
+            graph = hnswlib.Index(space="cosine", dim=self.matrix.shape[1])
+            graph.init_index(max_elements=len(self.ids), ef_construction=200, M=16)
+            graph.add_items(np.asarray(self.matrix), np.arange(len(self.ids)))
+            graph.set_ef(settings.HNSW_EF)
+            self.graph = graph
+        return self.graph
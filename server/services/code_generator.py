@@ -1,12 +1,17 @@
-import google.generativeai as genai
 import os
+import sys
 import install_dencencies
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Gemini calls go through the server's shared LLM gateway
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api.llm_gateway import generate
+from api.rate_limiter import Priority
+from api.code_cache import code_cache
 
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+MODEL = 'gemini-exp-1206'
 
 def read_prompt():
     try:
@@ -20,11 +25,12 @@ def read_prompt():
         return None
 
 def get_code_from_gemini(prompt):
-    """Get code generation from Gemini"""
+    """Get code generation from Gemini, reusing code already generated for the same prompt"""
+    cached = code_cache.get(prompt, MODEL)
+    if cached is not None:
+        print("Using cached code")
+        return cached["code"]
     try:
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-exp-1206')
-        
         # Add specific instruction to generate only code
         enhanced_prompt = f"""
         Generate only Python code without any explanations or markdown formatting.
@@ -34,16 +40,13 @@ def get_code_from_gemini(prompt):
         """
         
         # Generate response
-        response = model.generate_content(enhanced_prompt)
-        
-        # Extract code from response
-        generated_code = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if generated_code.startswith("```python"):
-            generated_code = generated_code.replace("```python", "").replace("```", "").strip()
+        response = generate(MODEL, enhanced_prompt, priority=Priority.CODEGEN)
         
-        return generated_code
+        # Remove markdown code blocks if present, and remember the code with its syntax check
+        entry = code_cache.put(prompt, MODEL, response.text)
+        if not entry["syntax_ok"]:
+            print(f"Warning: generated code has a syntax error: {entry['syntax_error']}")
+        return entry["code"]
     
     except Exception as e:
         print(f"Error generating code with Gemini: {str(e)}")
@@ -60,9 +63,10 @@ def execute_code(code):
         with open('generated_code.py','w+') as f:
             f.writelines(code)
 
-        os.system('python3 generated_code.py')
+        return os.system('python3 generated_code.py') == 0
     except Exception as e:
         print(f"Error executing code: {str(e)}")
+        return False
 
 def main():
     prompt = read_prompt()
@@ -75,7 +79,8 @@ def main():
     
     install_dencencies.main(generated_code)
     
-    execute_code(generated_code)
+    if execute_code(generated_code):
+        code_cache.mark_success(prompt, MODEL)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -9,6 +9,11 @@ from dotenv import load_dotenv
 from pinecone import Pinecone
 load_dotenv()
 
+# Share the server's embedding cache so commands embedded by either side are reused
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from api.embedding_cache import cached_embedding
+
 class VoiceChatBot:
     def __init__(self):
         self.root = ctk.CTk()
@@ -50,6 +55,9 @@ What if there's no command available? after thinking so much of course Just repl
         self.pinecone_index = self.pc.Index(self.index_name)
         
     def gemini_embed_text(self, text):
+        return cached_embedding("models/text-embedding-004", text, self.embed_uncached)
+
+    def embed_uncached(self, text):
         try:
             result = genai.embed_content(
                 model="models/text-embedding-004",